@@ -1,122 +1,225 @@
 import streamlit as st
-import numpy as np
+import hashlib
 import os
-import fitz
+import time
 from dotenv import load_dotenv
-from huggingface_hub import InferenceClient
-from sentence_transformers import SentenceTransformer
+import metrics
+import startup
+from generation import (
+    CURRICULUM_MODEL,
+    RAG_MODEL,
+    RECENT_STATS,
+    SECTIONED_MIN_WEEKS,
+    GenerationCancelled,
+    rag_context_budget,
+    stream_curriculum,
+    stream_mentor,
+    stream_rag_curriculum,
+    stream_roadmap,
+    stream_sectioned_curriculum,
+)
+from mentor import MENTOR_TOKEN_BUDGET, MentorIndex, MentorSession
+from response_cache import ResponseCache, cached_stream
+from curriculum_parser import (
+    RAG_SECTIONS,
+    TOPIC_SECTIONS,
+    append_repairs,
+    parse_curriculum,
+    repair_curriculum,
+    validate_curriculum,
+)
+
+# Heavy dependencies (torch, PyMuPDF, LanceDB, ReportLab) are imported on
+# first use of RAG, PDF export or embeddings, not at script start.
+
 
 @st.cache_resource
-def load_embedding_model():
-    return SentenceTransformer("all-MiniLM-L6-v2")
+def load_ingestion_client():
+    # Ingestion and embeddings run in a separate service process holding the
+    # only copy of the model; it is started here if not already running
+    from ingest_worker import IngestionClient
+    return IngestionClient()
 
-model = load_embedding_model()
 
+def _load_embedder():
+    from ingest_worker import RemoteEmbedder
+    return RemoteEmbedder(load_ingestion_client())
 
-# Load environment variables
-load_dotenv()
-HF_API_KEY = os.getenv("HF_API_KEY")
 
-client = InferenceClient(token=HF_API_KEY)
+@st.cache_resource
+def load_model_resource():
+    return startup.LazyResource("embedding_model", _load_embedder)
+
+model_resource = load_model_resource()
 
 
-def generate_curriculum(topic, academic_level, duration, program_focus, evaluation_framework):
+def get_model():
+    return model_resource.get()
 
-    prompt = f"""
-    Create a structured {duration}-week university curriculum.
 
-    Course Title: {topic}
-    Academic Level: {academic_level}
-    Program Focus: {program_focus}
-    Evaluation Framework: {evaluation_framework}
+@st.cache_resource
+def load_document_store():
+    with startup.timed("load:doc_store"):
+        from datetime import timedelta
+        from doc_store import DocumentStore
+        # Read-only here; the ingestion service writes the corpus table
+        return DocumentStore(read_consistency_interval=timedelta(0))
 
-    STRICT REQUIREMENTS:
 
-    1. The course MUST be exactly {duration} weeks.
-    2. Provide a weekly breakdown from Week 1 to Week {duration}.
-    3. Do NOT exceed or reduce the number of weeks.
-    4. Each week must contain:
-       - Topic
-       - Key Concepts
-       - Practical / Activity Component
-    5. After weekly plan include:
-       - Learning Outcomes (max 4 bullet points)
-       - Assessment Strategy aligned to {evaluation_framework}
-       - Relevant Job Roles (max 3 roles)
-    6. No introduction paragraph.
-    7. No repetition.
-    8. Follow clean structured format.
+def embed_if_warm(text):
+    # The semantic cache tier is skipped until the model has been warmed
+    model = model_resource.get_if_ready()
+    return None if model is None else model.encode(text)
 
-    Format:
 
-    Course Name:
-    Level:
-    Duration: {duration} Weeks
+@st.cache_resource
+def load_response_cache():
+    return ResponseCache(embed=embed_if_warm)
 
-    Weekly Plan:
-    Week 1:
-    Week 2:
-    ...
-    Week {duration}:
+response_cache = load_response_cache()
 
-    Learning Outcomes:
-    -
-    -
 
-    Assessment Strategy:
-    -
+@st.cache_resource
+def start_metrics_server():
+    # Opt-in Prometheus endpoint, started once per server process
+    port = os.getenv(metrics.METRICS_PORT_ENV)
+    return metrics.serve(int(port)) if port else None
 
-    Relevant Job Roles:
-    -
-    """
+start_metrics_server()
 
-    response = client.chat_completion(
-        model="meta-llama/Meta-Llama-3-8B-Instruct",
-        messages=[{"role": "user", "content": prompt}],
-        max_tokens=1800,
-        temperature=0.3 
-    )
 
-    return response.choices[0].message.content
-    
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
-from reportlab.lib import colors
-from reportlab.lib.units import inch
-from reportlab.platypus import ListFlowable, ListItem
-from reportlab.lib.pagesizes import A4
-from io import BytesIO
-
-import re
-
-def clean_markdown(text):
-    text = re.sub(r'#{1,6}\s*', '', text)
-    text = re.sub(r'\*\*', '', text)
-    text = re.sub(r'\*', '', text)
+@st.cache_resource
+def merge_ingestion_metrics():
+    # Extraction, embedding and index writes are recorded in the ingestion
+    # service; fold its series into /metrics and the diagnostics panel
+    metrics.REGISTRY.add_source(load_ingestion_client().snapshot, process="ingest")
+
+merge_ingestion_metrics()
+
+
+def ingestion_settings():
+    from chunking import DEFAULT_CONFIG
+    return {**DEFAULT_CONFIG.settings(), "model": get_model().name}
+
+
+@st.cache_resource
+def load_knowledge_base():
+    with startup.timed("load:knowledge_base"):
+        from knowledge_base import KnowledgeBase
+        # Used for listing and search only; adds and removals go to the ingestion service
+        return KnowledgeBase(load_document_store(), get_model().encode, ingestion_settings())
+
+
+DURATION_OPTIONS = [4, 8, 12, 16, 20, 24]
+RAG_CANDIDATES = 12
+
+
+@st.cache_resource
+def load_retriever():
+    from retrieval import Retriever, rag_queries
+    retriever = Retriever(load_knowledge_base(), get_model().encode)
+    # Every RAG query the duration selectbox can produce, in one encode call
+    retriever.embed([q for d in DURATION_OPTIONS for q in rag_queries(d)])
+    return retriever
+
+
+# Load environment variables
+load_dotenv()
+HF_API_KEY = os.getenv("HF_API_KEY")
+
+
+@st.cache_resource
+def load_inference_gateway():
+    # One gateway per server process: shared connections and concurrency limit
+    from inference import load_gateway
+    return load_gateway(HF_API_KEY)
+
+client = load_inference_gateway()
+
+
+def start_generation():
+    # A newer generation in this session cancels the one still streaming
+    st.session_state.generation_id = st.session_state.get("generation_id", 0) + 1
+    generation_id = st.session_state.generation_id
+    return lambda: st.session_state.get("generation_id") != generation_id
+
+
+def stream_to_ui(stream):
+    started = time.perf_counter()
+    placeholder = st.empty()
+    try:
+        with placeholder.container():
+            text = st.write_stream(stream)
+    except GenerationCancelled:
+        return None
+    finally:
+        placeholder.empty()
+    startup.record("first_request_s", time.perf_counter() - started)
     return text
 
-def generate_pdf(text):
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4)
 
-    styles = getSampleStyleSheet()
-    normal_style = styles["Normal"]
-    heading_style = styles["Heading1"]
+@st.cache_resource
+def load_pdf_exporter():
+    with startup.timed("load:pdf_export"):
+        from pdf_export import PdfExporter
+        return PdfExporter()
+
+
+def store_output(output, duration, required_sections=TOPIC_SECTIONS, week_fields=True,
+                 context=None, model=CURRICULUM_MODEL):
+    # Parse once; repair only what is missing instead of regenerating everything.
+    # Repairs are cached, so a cache hit on an incomplete plan replays the same fix
+    curriculum = parse_curriculum(output)
+    if validate_curriculum(curriculum, duration, required_sections, week_fields):
+        with st.spinner("Filling in missing sections..."):
+            curriculum, _ = repair_curriculum(
+                client, curriculum, duration, required_sections, week_fields,
+                context=context, model=model, cache=response_cache,
+            )
+        output = append_repairs(output, curriculum)
+    st.session_state.curriculum = curriculum
+    st.session_state.generated_output = output
+    # Start rendering the PDF off the script thread while the page redraws
+    load_pdf_exporter().submit(curriculum)
+
+
+def pdf_download(curriculum):
+    # ReportLab renders on the exporter's pool. Until it is done a fragment
+    # polls the future, so the roadmap and mentor below are not held up
+    future = load_pdf_exporter().submit(curriculum)
+    if future.done():
+        st.download_button(
+            label="📥 Download Curriculum as PDF",
+            data=future.result(),
+            file_name="Curriculum.pdf",
+            mime="application/pdf"
+        )
+        return
+
+    @st.fragment(run_every=0.5)
+    def pending():
+        if future.done():
+            # A full rerun draws the real button and stops the polling
+            st.rerun()
+        st.button("⏳ Preparing PDF...", disabled=True)
+
+    pending()
 
-    elements = []
 
-    for line in text.split("\n"):
-        if line.strip() == "":
-            elements.append(Spacer(1, 0.2 * inch))
-        elif "Course" in line or "Week" in line:
-            elements.append(Paragraph(line, heading_style))
-            elements.append(Spacer(1, 0.2 * inch))
-        else:
-            elements.append(Paragraph(line, normal_style))
+def current_mentor(curriculum):
+    # Re-index only when a new curriculum has been generated
+    mentor = st.session_state.get("mentor")
+    if mentor is None or mentor.index.curriculum is not curriculum:
+        mentor = MentorSession(MentorIndex(curriculum, get_model().encode), MENTOR_TOKEN_BUDGET)
+        st.session_state.mentor = mentor
+    return mentor
+
+
+def current_curriculum():
+    if st.session_state.get("curriculum") is None:
+        st.session_state.curriculum = parse_curriculum(st.session_state.generated_output)
+    return st.session_state.curriculum
 
-    doc.build(elements)
-    buffer.seek(0)
-    return buffer
 
 # Streamlit UI
 st.set_page_config(page_title="CurricuForge MVP")
@@ -216,7 +319,7 @@ div[role="radiogroup"]>label:hover{border-color:rgba(99,91,255,.4)!important;col
 st.subheader("AI-Powered Curriculum Generator")
 duration = st.selectbox(
     "Program Duration (Weeks)",
-    [4, 8, 12, 16, 20, 24]
+    DURATION_OPTIONS
 )
 
 academic_level = st.selectbox(
@@ -246,6 +349,7 @@ if "last_mode" not in st.session_state:
 
 if st.session_state.last_mode != mode:
     st.session_state.generated_output = ""
+    st.session_state.curriculum = None
     st.session_state.last_mode = mode
 
 # ---------------- TOPIC MODE ----------------
@@ -255,9 +359,27 @@ if mode == "Topic-Based":
 
     if st.button("Generate Curriculum"):
         if topic:
-            with st.spinner("Generating curriculum..."):
-                output = generate_curriculum(topic,academic_level,duration,program_focus,evaluation_framework)
-                st.session_state.generated_output = output
+            # Long programs: outline first, then week blocks in parallel
+            factory = (
+                stream_sectioned_curriculum if duration >= SECTIONED_MIN_WEEKS
+                else stream_curriculum
+            )
+            stream = factory(
+                client, topic, academic_level, duration, program_focus, evaluation_framework,
+                should_cancel=start_generation()
+            )
+            selectors = {
+                "model": stream.model,
+                "academic_level": academic_level,
+                "duration": duration,
+                "program_focus": program_focus,
+                "evaluation_framework": evaluation_framework,
+            }
+            output = stream_to_ui(
+                cached_stream(response_cache, stream, topic=topic, selectors=selectors)
+            )
+            if output:
+                store_output(output, duration)
         else:
             st.warning("Please enter a course title.")
 
@@ -265,75 +387,102 @@ if mode == "Topic-Based":
 # ---------------- RAG MODE ----------------
 elif mode == "Document-Based (RAG)":
 
-    uploaded_file = st.file_uploader("Upload Curriculum PDF", type=["pdf"])
-
-    if uploaded_file:
-        st.success("PDF uploaded successfully!")
-        import lancedb
-
-        # ---- Extract Text ----
-        def extract_text_from_uploaded(file):
-            text = ""
-            with fitz.open(stream=file.read(), filetype="pdf") as doc:
-                for page in doc:
-                    text += page.get_text()
-            return text
-
-        # ---- Chunk Text ----
-        def chunk_text(text, chunk_size=800):
-            return [text[i:i+chunk_size] for i in range(0, len(text), chunk_size)]
-
-        # ---- Process Document (runs once per upload) ----
-        text = extract_text_from_uploaded(uploaded_file)
-        chunks = chunk_text(text)
-        embeddings = model.encode(chunks)
-
-        db = lancedb.connect("lancedb")
-        table = db.create_table(
-            "curriculum",
-            data=[
-                {"text": chunks[i], "vector": embeddings[i]}
-                for i in range(len(chunks))
-            ],
-            mode="overwrite"
-        )
-
-        # ---- Generate Button ----
-        if st.button("Generate From Document"):
-
-            query_embedding = model.encode(
-                [f"Create a structured {duration}-week academic curriculum"]
-            )[0]
+    knowledge_base = load_knowledge_base()
 
-            results = table.search(query_embedding).limit(5).to_list()
-
-            retrieved_texts = [r["text"] for r in results]
-            context = "\n\n".join(retrieved_texts)
+    uploaded_files = st.file_uploader(
+        "Add Curriculum PDFs to the Knowledge Base", type=["pdf"], accept_multiple_files=True
+    )
 
-            prompt = f"""
-            You are an academic curriculum restructuring engine.
+    # ---- Add / update documents (only changed pages are re-embedded) ----
+    if uploaded_files:
+        from pdf_extract import spool_upload
+
+        ingestion_client = load_ingestion_client()
+        jobs = st.session_state.setdefault("ingest_jobs", {})
+
+        upload_keys = []
+        for uploaded_file in uploaded_files:
+            # Keyed by content, so a new version under the same name is resubmitted
+            digest = hashlib.sha256(uploaded_file.getvalue()).hexdigest()
+            upload_key = f"{uploaded_file.name}:{digest}"
+            upload_keys.append(upload_key)
+            if upload_key not in jobs:
+                # The service deletes the spooled copy when the job finishes
+                jobs[upload_key] = ingestion_client.submit(
+                    spool_upload(uploaded_file), uploaded_file.name
+                )
+
+        # ---- Poll the service until this session's uploads are indexed ----
+        bars = {key: st.empty() for key in upload_keys}
+        while True:
+            running = False
+            for key in upload_keys:
+                if key not in jobs:
+                    continue
+                job = ingestion_client.status(jobs[key])
+                name = key.rsplit(":", 1)[0]
+                if job is None or job["status"] == "error":
+                    # Failed, or lost in a service restart: resubmitted on the next rerun
+                    del jobs[key]
+                    bars[key].error(f"{name}: {job['error'] if job else 'job lost'}")
+                elif job["status"] == "done":
+                    result = job["result"]
+                    bars[key].caption(
+                        f"✅ {name}: {len(result['changed_pages'])} page(s) indexed, "
+                        f"{len(result['removed_pages'])} removed"
+                    )
+                else:
+                    running = True
+                    fraction = job["done"] / job["total"] if job["total"] else 0.0
+                    bars[key].progress(
+                        min(fraction, 1.0), text=f"{name}: {job['stage'] or job['status']}"
+                    )
+            if not running:
+                break
+            time.sleep(0.5)
+
+    sources = knowledge_base.sources()
+
+    if sources:
+        selected_sources = st.multiselect(
+            "Documents to draw from", sources, default=sources
+        )
 
-            Use ONLY the following retrieved sections:
+        with st.expander("Manage Knowledge Base"):
+            for document in knowledge_base.documents():
+                st.caption(
+                    f"{document['source']}: {document['pages']} pages, {document['chunks']} chunks"
+                )
+            to_remove = st.selectbox("Remove a document", [""] + sources)
+            if to_remove and st.button("Remove"):
+                load_ingestion_client().remove(to_remove)
+                st.rerun()
 
-            {context}
+        # ---- Generate Button ----
+        if st.button("Generate From Documents") and selected_sources:
 
-            Restructure this into a structured {duration}-week academic course plan.
-            Include:
-            - Course Overview
-            - Weekly Breakdown
-            - Learning Outcomes
-            - Assessment Strategy
+            from context_builder import build_context
+            from retrieval import rag_queries
 
-            Do NOT add external information.
-            """
+            # Overview, weekly and assessment queries: one encode, one search pass, cached
+            retriever = load_retriever()
+            queries = rag_queries(duration)
+            results = retriever.retrieve(queries, k=RAG_CANDIDATES, sources=selected_sources)
 
-            response = client.chat_completion(
-                model="mistralai/Mistral-7B-Instruct-v0.2",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=2000
+            # Deduplicated, MMR-ranked and merged within the token budget
+            context, _ = build_context(
+                results, retriever.embed(queries), rag_context_budget(duration)
             )
 
-            st.session_state.generated_output = response.choices[0].message.content
+            stream = stream_rag_curriculum(
+                client, context, duration, should_cancel=start_generation()
+            )
+            output = stream_to_ui(cached_stream(response_cache, stream))
+            if output:
+                store_output(
+                    output, duration, RAG_SECTIONS, week_fields=False,
+                    context=context, model=RAG_MODEL,
+                )
 
 # ==================================================
 # 📘 Generated Curriculum
@@ -344,15 +493,8 @@ if "generated_output" in st.session_state and st.session_state.generated_output:
     st.markdown("## 📘 Generated Curriculum")
     st.markdown(st.session_state.generated_output)
 
-    clean_text = clean_markdown(st.session_state.generated_output)
-    pdf_file = generate_pdf(clean_text)
-
-    st.download_button(
-        label="📥 Download Curriculum as PDF",
-        data=pdf_file,
-        file_name="Curriculum.pdf",
-        mime="application/pdf"
-    )
+    curriculum = current_curriculum()
+    pdf_download(curriculum)
 # ==================================================
 # 📍 Career Roadmap Generator
 # ==================================================
@@ -364,34 +506,14 @@ if "generated_output" in st.session_state and st.session_state.generated_output:
 
     if st.button("Generate 1-Year Career Roadmap"):
 
-        with st.spinner("Generating roadmap..."):
-
-            roadmap_prompt = f"""
-            Based on the following curriculum:
-
-            {st.session_state.generated_output}
-
-            Generate a structured 1-year career roadmap.
-
-            Requirements:
-            - Divide into 4 clear phases
-            - Include skills to focus on
-            - Include practical projects
-            - Include career milestones
-            - Keep response concise and structured
-            """
-
-            response = client.chat_completion(
-                model="meta-llama/Meta-Llama-3-8B-Instruct",
-                messages=[{"role": "user", "content": roadmap_prompt}],
-                max_tokens=800,
-                temperature=0.4
-            )
-
-            roadmap_output = response.choices[0].message.content
-
         st.markdown("### 🚀 Your 1-Year Roadmap")
-        st.markdown(roadmap_output)
+        stream = stream_roadmap(
+            client, curriculum.summary(), should_cancel=start_generation()
+        )
+        try:
+            st.write_stream(stream)
+        except GenerationCancelled:
+            pass
 # ==================================================
     # 💬 AI Mentor Chatbot (Bottom Section)
     # ==================================================
@@ -412,30 +534,36 @@ if "generated_output" in st.session_state and st.session_state.generated_output:
 
         st.session_state.chat_history.append(("user", user_question))
 
-        with st.spinner("Thinking..."):
-
-            chat_prompt = f"""
-            You are an academic AI mentor.
-
-            Curriculum:
-            {st.session_state.generated_output}
-
-            Question:
-            {user_question}
-
-            Give a concise and structured response.
-            """
+        mentor = current_mentor(curriculum)
+        context, history = mentor.context(user_question)
 
-            response = client.chat_completion(
-                model="meta-llama/Meta-Llama-3-8B-Instruct",
-                messages=[{"role": "user", "content": chat_prompt}],
-                max_tokens=400,
-                temperature=0.3
+        with st.chat_message("assistant"):
+            stream = stream_mentor(
+                client, context, user_question, history, should_cancel=start_generation()
             )
+            try:
+                answer = st.write_stream(stream)
+            except GenerationCancelled:
+                answer = stream.text
 
-            answer = response.choices[0].message.content
-
+        mentor.record(user_question, answer)
         st.session_state.chat_history.append(("assistant", answer))
 
-        with st.chat_message("assistant"):
-            st.markdown(answer)
+# ---------------- DIAGNOSTICS ----------------
+if os.getenv("CURRICUFORGE_DIAGNOSTICS") == "1":
+    with st.expander("Diagnostics"):
+        snapshot = metrics.REGISTRY.snapshot()
+        st.caption("Stage latencies and call counts since the server started")
+        st.dataframe(
+            [{k: v for k, v in h.items() if k != "buckets"} for h in snapshot["histograms"]],
+            use_container_width=True,
+        )
+        st.dataframe(snapshot["counters"], use_container_width=True)
+        st.caption("Recent LLM calls")
+        st.dataframe([s.as_dict() for s in list(RECENT_STATS)], use_container_width=True)
+        st.json(startup.report())
+
+# Page is painted: load the embedding model in the background for later RAG,
+# mentor and semantic-cache use
+startup.mark("first_paint")
+model_resource.warm()
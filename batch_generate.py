@@ -0,0 +1,330 @@
+"""Headless batch generation of course catalogs.
+
+    python batch_generate.py topics.csv --out catalog.jsonl --pdf-dir pdfs --workers 4
+
+Each input row (CSV or JSONL) needs a `topic`; `id`, `academic_level`,
+`duration`, `program_focus`, `evaluation_framework` and `document` (a PDF
+path for document-based generation) are optional. Results are appended to
+the output JSONL as they finish; rerunning with the same output skips items
+that already succeeded.
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+
+from dotenv import load_dotenv
+from curriculum_parser import (
+    RAG_SECTIONS,
+    TOPIC_SECTIONS,
+    append_repairs,
+    parse_curriculum,
+    repair_curriculum,
+    validate_curriculum,
+)
+from generation import (
+    CURRICULUM_MODEL,
+    RAG_MODEL,
+    generate_curriculum,
+    rag_context_budget,
+    stream_rag_curriculum,
+)
+from inference import load_gateway
+
+
+DEFAULTS = {
+    "academic_level": "Foundation Level",
+    "duration": 4,
+    "program_focus": "Theoretical Emphasis",
+    "evaluation_framework": "Continuous Assessment",
+    "document": "",
+}
+
+
+# ---- Rate limiting and retries ----
+class RateLimiter:
+    """Token bucket shared by all workers: `rate` calls per second, bursts of `burst`."""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def with_retries(fn, retries=4, base_delay=1.0, max_delay=30.0):
+    for attempt in range(retries + 1):
+        try:
+            return fn()
+        except Exception:
+            if attempt == retries:
+                raise
+            delay = min(max_delay, base_delay * 2 ** attempt)
+            time.sleep(delay * random.uniform(0.5, 1.5))
+
+
+class ThrottledClient:
+    """Client wrapper applying the shared rate limit and retries per call."""
+
+    def __init__(self, client, limiter, retries=4):
+        self.client = client
+        self.limiter = limiter
+        self.retries = retries
+
+    def chat_completion(self, **kwargs):
+        def call():
+            self.limiter.acquire()
+            return self.client.chat_completion(**kwargs)
+        return with_retries(call, self.retries)
+
+
+# ---- Input / output ----
+def read_items(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            rows = [json.loads(line) for line in f if line.strip()]
+        else:
+            rows = list(csv.DictReader(f))
+
+    items = []
+    for row in rows:
+        item = dict(DEFAULTS)
+        item.update({k: v for k, v in row.items() if v not in (None, "")})
+        item["duration"] = int(item["duration"])
+        if not item.get("topic") and not item.get("document"):
+            raise ValueError(f"row without topic or document: {row}")
+        item.setdefault("topic", "")
+        if not item.get("id"):
+            key = json.dumps({k: item[k] for k in ("topic", *DEFAULTS)}, sort_keys=True)
+            item["id"] = hashlib.sha1(key.encode("utf-8")).hexdigest()[:12]
+        items.append(item)
+    return items
+
+
+def completed_ids(path):
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # Torn last line from a crash; the item is simply redone
+                continue
+            if record.get("status") == "ok":
+                done.add(record["id"])
+    return done
+
+
+class ResultWriter:
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def write(self, record):
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+
+# ---- Document-based generation ----
+class RagPipeline:
+    """Knowledge base ingestion and retrieval shared by all workers, loaded on first use.
+
+    Documents are added to the same knowledge base as the app's uploads,
+    through the ingestion service, so the store has a single writer and
+    re-running a catalog only re-embeds pages that changed. A document's
+    source name is "batch:" plus its path relative to `root` (the input
+    file's directory), so same-named files in different folders, or an
+    upload of the same name, never overwrite each other.
+    """
+
+    def __init__(self, root=None):
+        self.root = os.path.abspath(root or os.curdir)
+        self._lock = threading.Lock()
+        self._ready = False
+        self._added = {}
+
+    def _load(self):
+        with self._lock:
+            if self._ready:
+                return
+            from datetime import timedelta
+
+            from chunking import DEFAULT_CONFIG
+            from doc_store import DocumentStore
+            from ingest_worker import IngestionClient, RemoteEmbedder
+            from knowledge_base import KnowledgeBase
+            from retrieval import Retriever
+
+            self.ingestion = IngestionClient()
+            model = RemoteEmbedder(self.ingestion)
+            settings = {**DEFAULT_CONFIG.settings(), "model": model.name}
+            # Read-only here, like the app; the service writes
+            store = DocumentStore(read_consistency_interval=timedelta(0))
+            self.knowledge_base = KnowledgeBase(store, model.encode, settings)
+            self.retriever = Retriever(self.knowledge_base, model.encode)
+            self._ready = True
+
+    def add(self, path):
+        """Ingest `path` once per run; returns its source name."""
+        self._load()
+        path = os.path.abspath(path)
+        with self._lock:
+            future = self._added.get(path)
+            owner = future is None
+            if owner:
+                future = self._added[path] = Future()
+        if not owner:
+            return future.result()
+
+        source = "batch:" + os.path.relpath(path, self.root).replace(os.sep, "/")
+        try:
+            job = self.ingestion.wait(self.ingestion.submit(path, source, cleanup=False))
+            if job is None or job["status"] != "done":
+                raise RuntimeError(f"ingesting {path} failed: {job and job['error']}")
+        except Exception as exc:
+            future.set_exception(exc)
+            with self._lock:
+                self._added.pop(path, None)
+            raise
+        future.set_result(source)
+        return source
+
+    def context(self, path, duration, k=12):
+        from context_builder import build_context
+        from retrieval import rag_queries
+
+        source = self.add(path)
+        queries = rag_queries(duration)
+        results = self.retriever.retrieve(queries, k=k, sources=[source])
+        context, _ = build_context(
+            results, self.retriever.embed(queries), rag_context_budget(duration)
+        )
+        return context
+
+
+# ---- Worker ----
+def run_item(item, client, rag, pdf_exporter=None, pdf_dir=None):
+    started = time.perf_counter()
+    duration = item["duration"]
+
+    if item.get("document"):
+        context = rag.context(item["document"], duration)
+        output = stream_rag_curriculum(client, context, duration).collect()
+        required, week_fields, model = RAG_SECTIONS, False, RAG_MODEL
+    else:
+        context = None
+        output = generate_curriculum(
+            client, item["topic"], item["academic_level"], duration,
+            item["program_focus"], item["evaluation_framework"],
+        )
+        required, week_fields, model = TOPIC_SECTIONS, True, CURRICULUM_MODEL
+
+    curriculum = parse_curriculum(output)
+    issues = []
+    if validate_curriculum(curriculum, duration, required, week_fields):
+        curriculum, issues = repair_curriculum(
+            client, curriculum, duration, required, week_fields, context=context, model=model
+        )
+        output = append_repairs(output, curriculum)
+
+    record = {
+        **item,
+        "status": "ok",
+        "output": output,
+        "weeks": len(curriculum.weeks),
+        "issues": [list(issue) for issue in issues],
+        "elapsed_s": round(time.perf_counter() - started, 3),
+    }
+    if pdf_exporter is not None:
+        pdf_path = os.path.join(pdf_dir, f"{item['id']}.pdf")
+        with open(pdf_path, "wb") as f:
+            f.write(pdf_exporter.export(curriculum))
+        record["pdf"] = pdf_path
+    return record
+
+
+def run_batch(items, client, out_path, workers=4, item_retries=2, pdf_dir=None, log=print,
+              document_root=None):
+    done = completed_ids(out_path)
+    pending = [item for item in items if item["id"] not in done]
+    log(f"{len(items)} items, {len(items) - len(pending)} already done, {len(pending)} to run")
+
+    pdf_exporter = None
+    if pdf_dir:
+        from pdf_export import PdfExporter
+
+        os.makedirs(pdf_dir, exist_ok=True)
+        pdf_exporter = PdfExporter()
+
+    rag = RagPipeline(document_root)
+    writer = ResultWriter(out_path)
+
+    def work(item):
+        try:
+            return with_retries(lambda: run_item(item, client, rag, pdf_exporter, pdf_dir), item_retries)
+        except Exception as exc:
+            return {**item, "status": "error", "error": f"{type(exc).__name__}: {exc}"}
+
+    failures = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(work, item) for item in pending]
+        for n, future in enumerate(as_completed(futures), 1):
+            record = future.result()
+            writer.write(record)
+            failures += record["status"] != "ok"
+            log(f"[{n}/{len(pending)}] {record['id']} {record['status']}")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate curricula for a list of topics")
+    parser.add_argument("input", help="CSV or JSONL file of topics and selector settings")
+    parser.add_argument("--out", default="catalog.jsonl", help="results JSONL (appended, used to resume)")
+    parser.add_argument("--pdf-dir", help="also write one PDF per curriculum here")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=2.0, help="max inference calls per second")
+    parser.add_argument("--retries", type=int, default=4, help="retries per inference call")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    # The gateway retries and falls back per call; the wrapper only rate-limits
+    client = ThrottledClient(
+        load_gateway(os.getenv("HF_API_KEY"), retries=args.retries, max_concurrency=args.workers),
+        RateLimiter(args.rate, burst=max(1, args.workers)),
+        retries=0,
+    )
+    failures = run_batch(
+        read_items(args.input), client, args.out, args.workers, pdf_dir=args.pdf_dir,
+        log=lambda message: print(message, file=sys.stderr),
+        document_root=os.path.dirname(os.path.abspath(args.input)),
+    )
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,371 @@
+"""Offline benchmark of the ingestion, retrieval and generation pipeline.
+
+    python benchmark.py --sizes 8,32,128 --sessions 1,4,16 --out benchmarks/run.json
+
+Synthetic curricula of growing length are rendered to PDF and pushed
+through extraction, chunking, embedding, LanceDB indexing and retrieval.
+Each week carries a unique concept, so a question about it has a known
+answer, which gives recall@k. Generation runs against FakeInferenceClient,
+a local stand-in for the Hugging Face API with configurable latency and
+token rate, under N concurrent sessions. Nothing touches the network
+unless `--embedder` selects a model that is not cached locally.
+"""
+import argparse
+import hashlib
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import numpy as np
+
+from chunking import DEFAULT_CONFIG, chunk_pages, estimate_tokens
+from curriculum_parser import (
+    TOPIC_SECTIONS,
+    Curriculum,
+    Week,
+    parse_curriculum,
+    repair_curriculum,
+    validate_curriculum,
+)
+from generation import RECENT_STATS, generate_curriculum
+
+
+ADJECTIVES = [
+    "adaptive", "bayesian", "causal", "distributed", "elastic", "federated", "generative",
+    "hierarchical", "incremental", "kinetic", "latent", "modular", "neural", "optimal",
+    "probabilistic", "quantised", "recursive", "sparse", "temporal", "variational",
+]
+NOUNS = [
+    "annealing", "bandits", "caching", "diffusion", "embeddings", "filtering", "graphs",
+    "hashing", "inference", "kernels", "lattices", "manifolds", "networks", "ontologies",
+    "pipelines", "queues", "routing", "sampling", "transformers", "wavelets",
+]
+FILLER = (
+    "Students read the assigned chapter, discuss the worked examples in small groups "
+    "and summarise the main argument in their own words before the seminar."
+)
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else None
+
+
+def latency_summary(values):
+    return {
+        "n": len(values),
+        "mean_s": float(np.mean(values)) if values else None,
+        "p50_s": percentile(values, 50),
+        "p95_s": percentile(values, 95),
+    }
+
+
+# ---- Synthetic data ----
+def concept_terms(count, seed=0):
+    pairs = [f"{a} {n}" for a in ADJECTIVES for n in NOUNS]
+    random.Random(seed).shuffle(pairs)
+    if count > len(pairs):
+        # Beyond the vocabulary, suffix a counter to keep every term unique
+        pairs += [f"{pairs[i % len(pairs)]} {i}" for i in range(len(pairs), count)]
+    return pairs[:count]
+
+
+def synthetic_curriculum(topic, weeks, filler_lines=3, seed=0):
+    terms = concept_terms(weeks, seed)
+    curriculum = Curriculum(
+        course_name=topic,
+        level="Foundation Level",
+        duration=f"{weeks} Weeks",
+        overview=[f"A {weeks}-week course on {topic}."],
+        outcomes=[f"Apply {terms[0]} to real problems", f"Evaluate {terms[-1]} in practice"],
+        assessment=["Weekly quizzes", "Final project"],
+        job_roles=["Data Scientist", "ML Engineer"],
+    )
+    for number, term in enumerate(terms, 1):
+        curriculum.weeks.append(Week(
+            number,
+            title=f"Foundations of {term}",
+            topic=f"{term.capitalize()} and where {term} is used",
+            key_concepts=f"{term}, worked examples of {term}",
+            practical=f"Lab: implement {term} on a small dataset",
+            notes=[FILLER] * filler_lines,
+        ))
+    return curriculum
+
+
+def labeled_queries(curriculum):
+    """One question per week whose answer must mention that week's concept."""
+    queries = []
+    for week in curriculum.weeks:
+        term = week.key_concepts.split(",")[0]
+        queries.append({"query": f"Which week covers {term}?", "relevant": term.lower()})
+    return queries
+
+
+def write_pdf(curriculum, directory):
+    from pdf_export import PdfExporter
+
+    path = os.path.join(directory, f"synthetic_{len(curriculum.weeks)}w.pdf")
+    with open(path, "wb") as f:
+        f.write(PdfExporter().render(curriculum))
+    return path
+
+
+# ---- Local stand-ins ----
+class FakeInferenceClient:
+    """Answers chat_completion locally in the shape of the Hugging Face API.
+
+    Waits `latency` seconds before the first token, then streams tokens at
+    `tokens_per_second` (0 for no delay). Curriculum, outline and week-block
+    prompts get well-formed synthetic answers, anything else filler text.
+    """
+
+    def __init__(self, latency=0.2, tokens_per_second=200.0, error_rate=0.0, seed=0):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def chat_completion(self, model, messages, max_tokens=None, temperature=None, stream=False):
+        with self._lock:
+            self.calls += 1
+            fail = self._random.random() < self.error_rate
+        if fail:
+            raise RuntimeError("fake upstream error")
+        text = self.respond(messages[-1]["content"])
+        tokens = re.findall(r"\S+\s*|\s+", text)[:max_tokens]
+        if not stream:
+            time.sleep(self.latency + self._token_delay() * len(tokens))
+            message = SimpleNamespace(content="".join(tokens))
+            return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+        return self._stream(tokens)
+
+    def _token_delay(self):
+        return 1.0 / self.tokens_per_second if self.tokens_per_second else 0.0
+
+    def _stream(self, tokens):
+        time.sleep(self.latency)
+        delay = self._token_delay()
+        for token in tokens:
+            if delay:
+                time.sleep(delay)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=token))])
+
+    @staticmethod
+    def respond(prompt):
+        block = re.search(r"Expand ONLY Week (\d+) to Week (\d+)", prompt)
+        weeks = re.search(r"(\d+)-week", prompt)
+        topic = re.search(r"Course Title:\s*(.+)", prompt)
+        topic = topic.group(1).strip() if topic else "Synthetic Course"
+
+        if block:
+            start, end = int(block.group(1)), int(block.group(2))
+            curriculum = synthetic_curriculum(topic, end, filler_lines=0)
+            return "\n\n".join(w.to_markdown() for w in curriculum.weeks[start - 1:end])
+        if weeks:
+            curriculum = synthetic_curriculum(topic, int(weeks.group(1)), filler_lines=0)
+            if "concise outline" in prompt:
+                for week in curriculum.weeks:
+                    week.topic = week.key_concepts = week.practical = ""
+            return curriculum.to_markdown()
+        return " ".join([FILLER] * 4)
+
+
+class HashingEmbedder:
+    """Deterministic bag-of-words embedder for runs without a local model."""
+
+    def __init__(self, dimension=384):
+        self.name = f"hashing-{dimension}"
+        self.dimension = dimension
+
+    def encode(self, texts):
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in re.findall(r"\w+", text.lower()):
+                vectors[row, zlib.crc32(word.encode("utf-8")) % self.dimension] += 1.0
+        vectors /= np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-9, None)
+        return vectors[0] if single else vectors
+
+
+def load_benchmark_embedder(kind):
+    if kind == "hashing":
+        return HashingEmbedder()
+    from embeddings import load_embedder
+
+    try:
+        return load_embedder(None if kind == "auto" else kind, use_cache=False)
+    except Exception as exc:
+        if kind != "auto":
+            raise
+        print(f"embedding model unavailable ({exc}); using the hashing embedder", file=sys.stderr)
+        return HashingEmbedder()
+
+
+# ---- Stages ----
+def bench_document(weeks, embedder, workdir, k=5, store_path=None):
+    from doc_store import DocumentStore
+    from pdf_extract import iter_pages
+
+    curriculum = synthetic_curriculum(f"Synthetic Course {weeks}", weeks)
+    path = write_pdf(curriculum, workdir)
+    result = {"weeks": weeks, "pdf_bytes": os.path.getsize(path)}
+
+    started = time.perf_counter()
+    pages = list(iter_pages(path))
+    result["extract_s"] = time.perf_counter() - started
+    result["pages"] = len(pages)
+
+    started = time.perf_counter()
+    pairs = list(chunk_pages(iter(pages), DEFAULT_CONFIG))
+    result["chunk_s"] = time.perf_counter() - started
+    chunks = [chunk for chunk, _ in pairs]
+    metadata = [meta for _, meta in pairs]
+    result["chunks"] = len(chunks)
+    result["chunk_tokens"] = sum(estimate_tokens(chunk) for chunk in chunks)
+
+    started = time.perf_counter()
+    vectors = np.asarray(embedder.encode(chunks), dtype=np.float32)
+    result["embed_s"] = time.perf_counter() - started
+    result["embed_chunks_per_s"] = len(chunks) / result["embed_s"] if result["embed_s"] else None
+
+    store = DocumentStore(store_path or os.path.join(workdir, "lancedb"), compact_interval=3600)
+    doc_id = hashlib.sha256(f"{embedder.name}:{weeks}".encode("utf-8")).hexdigest()
+    started = time.perf_counter()
+    store.upsert_chunks(doc_id, chunks, vectors, metadata)
+    result["index_s"] = time.perf_counter() - started
+
+    queries = labeled_queries(curriculum)
+    query_vectors = np.asarray(embedder.encode([q["query"] for q in queries]), dtype=np.float32)
+    for mode in ("vector", "hybrid"):
+        latencies, hits = [], 0
+        for query, vector in zip(queries, query_vectors):
+            started = time.perf_counter()
+            if mode == "vector":
+                results = store.search(doc_id, vector, k=k)
+            else:
+                results = store.hybrid_search(doc_id, query["query"], vector, k=k)
+            latencies.append(time.perf_counter() - started)
+            hits += any(query["relevant"] in r["text"].lower() for r in results)
+        result[f"{mode}_search"] = {
+            **latency_summary(latencies),
+            f"recall@{k}": hits / len(queries),
+        }
+    return result
+
+
+def bench_sessions(sessions, duration, client, topics_per_session=1):
+    """Topic-mode generation, parsing and repair in `sessions` concurrent threads."""
+    RECENT_STATS.clear()
+
+    def session(n):
+        latencies = []
+        for i in range(topics_per_session):
+            started = time.perf_counter()
+            output = generate_curriculum(
+                client, f"Synthetic Topic {n}-{i}", "Foundation Level", duration,
+                "Theoretical Emphasis", "Continuous Assessment",
+            )
+            curriculum = parse_curriculum(output)
+            if validate_curriculum(curriculum, duration, TOPIC_SECTIONS):
+                curriculum, _ = repair_curriculum(client, curriculum, duration, TOPIC_SECTIONS, True)
+            latencies.append(time.perf_counter() - started)
+        return latencies
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        latencies = [t for result in pool.map(session, range(sessions)) for t in result]
+    wall = time.perf_counter() - started
+
+    stats = [s for s in list(RECENT_STATS) if s.finished is not None]
+    ttft = [s.time_to_first_token for s in stats if s.time_to_first_token is not None]
+    tokens = sum(s.tokens for s in stats if not s.name.startswith("sectioned"))
+    return {
+        "sessions": sessions,
+        "duration_weeks": duration,
+        "wall_s": wall,
+        "curricula_per_s": len(latencies) / wall,
+        "tokens_per_s": tokens / wall,
+        "latency": latency_summary(latencies),
+        "ttft": latency_summary(ttft),
+    }
+
+
+# ---- Runner ----
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(sizes, sessions, durations, embedder_kind="auto", latency=0.2, tokens_per_second=200.0,
+        k=5, log=print):
+    embedder = load_benchmark_embedder(embedder_kind)
+    client = FakeInferenceClient(latency=latency, tokens_per_second=tokens_per_second)
+    report = {
+        "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git": git_revision(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "embedder": embedder.name,
+        "fake_client": {"latency_s": latency, "tokens_per_second": tokens_per_second},
+        "documents": [],
+        "generation": [],
+    }
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for weeks in sizes:
+            log(f"document: {weeks} weeks")
+            report["documents"].append(bench_document(weeks, embedder, workdir, k=k))
+
+    for duration in durations:
+        for count in sessions:
+            log(f"generation: {count} sessions x {duration} weeks")
+            report["generation"].append(bench_sessions(count, duration, client))
+    return report
+
+
+def int_list(value):
+    return [int(v) for v in value.split(",") if v]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline offline")
+    parser.add_argument("--sizes", type=int_list, default=[8, 32, 128], help="weeks per synthetic PDF")
+    parser.add_argument("--sessions", type=int_list, default=[1, 4, 16], help="concurrent sessions")
+    parser.add_argument("--durations", type=int_list, default=[8, 16], help="generated weeks")
+    parser.add_argument("--embedder", default="auto", help="auto, onnx, torch or hashing")
+    parser.add_argument("--latency", type=float, default=0.2, help="fake time to first token (s)")
+    parser.add_argument("--token-rate", type=float, default=200.0, help="fake tokens per second")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--out", default=os.path.join("benchmarks", f"{time.strftime('%Y%m%d-%H%M%S')}.json"))
+    args = parser.parse_args(argv)
+
+    log = lambda message: print(message, file=sys.stderr)
+    report = run(args.sizes, args.sessions, args.durations, args.embedder,
+                 args.latency, args.token_rate, args.k, log)
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    log(f"results written to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,243 @@
+import hashlib
+import re
+from collections import Counter
+from dataclasses import asdict, dataclass
+
+
+@dataclass(frozen=True)
+class ChunkConfig:
+    max_tokens: int = 200
+    overlap_tokens: int = 40
+    dedup: bool = True
+    near_duplicate_bits: int = 3
+    boilerplate_pages: int = 3
+    boilerplate_margin: int = 3
+
+    def settings(self):
+        return {"chunker": "structured-v2", **asdict(self)}
+
+
+DEFAULT_CONFIG = ChunkConfig()
+
+TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+HEADING_RE = re.compile(
+    r"^\s*(#{1,6}\s+\S|(week|module|unit|chapter|section|lecture|part)\s*[\dIVX]+\b"
+    r"|\d+(\.\d+)*\.?\s+[A-Z])",
+    re.IGNORECASE,
+)
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+NUMBER_RE = re.compile(r"\b\d+\b")
+
+
+def estimate_tokens(text):
+    return len(TOKEN_RE.findall(text))
+
+
+def trim_to_tokens(text, budget):
+    """`text` cut at a word boundary to about `budget` tokens, keeping its line breaks."""
+    if estimate_tokens(text) <= budget:
+        return text
+    kept = []
+    used = 0
+    for part in re.split(r"(\s+)", text):
+        used += estimate_tokens(part)
+        if used > budget:
+            break
+        kept.append(part)
+    return "".join(kept).rstrip() + " …"
+
+
+def is_heading(line):
+    stripped = line.strip()
+    if not stripped or len(stripped) > 120:
+        return False
+    if HEADING_RE.match(stripped):
+        return True
+    letters = [c for c in stripped if c.isalpha()]
+    return len(letters) >= 4 and stripped.isupper()
+
+
+# ---- Structure ----
+def split_blocks(text):
+    """Split page text into (is_heading, text) blocks on headings and blank lines."""
+    blocks = []
+    paragraph = []
+
+    def flush():
+        if paragraph:
+            blocks.append((False, " ".join(paragraph)))
+            paragraph.clear()
+
+    for line in text.splitlines():
+        if not line.strip():
+            flush()
+        elif is_heading(line):
+            flush()
+            blocks.append((True, line.strip()))
+        else:
+            paragraph.append(line.strip())
+    flush()
+    return blocks
+
+
+def _split_oversized(text, max_tokens):
+    # Sentences first, then hard word windows for run-on text
+    pieces = []
+    for sentence in SENTENCE_RE.split(text):
+        words = sentence.split()
+        if estimate_tokens(sentence) <= max_tokens:
+            pieces.append(sentence)
+            continue
+        step = max(1, int(max_tokens * 0.7))
+        for i in range(0, len(words), step):
+            pieces.append(" ".join(words[i:i + step]))
+    return pieces
+
+
+def _tail(text, overlap_tokens):
+    if overlap_tokens <= 0:
+        return ""
+    words = text.split()
+    tail = []
+    count = 0
+    for word in reversed(words):
+        count += estimate_tokens(word)
+        if count > overlap_tokens:
+            break
+        tail.append(word)
+    return " ".join(reversed(tail))
+
+
+def pack_blocks(blocks, config=DEFAULT_CONFIG):
+    """Pack structural blocks into chunks of at most config.max_tokens.
+
+    A heading always opens a new chunk. Chunks continuing the same section
+    start with the last config.overlap_tokens of the previous one.
+    """
+    chunks = []
+    current = []
+    current_tokens = 0
+
+    def flush():
+        nonlocal current, current_tokens
+        if current:
+            chunks.append("\n".join(current))
+        current = []
+        current_tokens = 0
+
+    for heading, text in blocks:
+        if heading:
+            flush()
+
+        pieces = [text] if estimate_tokens(text) <= config.max_tokens else _split_oversized(text, config.max_tokens)
+        for piece in pieces:
+            tokens = estimate_tokens(piece)
+            if current and current_tokens + tokens > config.max_tokens:
+                carry = _tail(current[-1], config.overlap_tokens)
+                flush()
+                if carry and estimate_tokens(carry) + tokens <= config.max_tokens:
+                    current = [carry]
+                    current_tokens = estimate_tokens(carry)
+            current.append(piece)
+            current_tokens += tokens
+    flush()
+    return chunks
+
+
+# ---- Dedup ----
+def simhash(text, bits=64):
+    words = text.lower().split()
+    shingles = [" ".join(words[i:i + 3]) for i in range(max(1, len(words) - 2))]
+    weights = [0] * bits
+    for shingle in shingles:
+        h = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for b in range(bits):
+            weights[b] += 1 if h >> b & 1 else -1
+    return sum(1 << b for b in range(bits) if weights[b] > 0)
+
+
+class Deduplicator:
+    """Drops repeated header/footer lines and exact or near-duplicate chunks.
+
+    Only the first and last boilerplate_margin lines of a page (fewer on
+    short pages) can be a running header or footer, and numbers are masked
+    there so "Page 3 of 300" matches across pages. Body lines are never
+    stripped. Near duplicates are simhashes within near_duplicate_bits,
+    looked up through four 16-bit bands.
+    """
+
+    def __init__(self, config=DEFAULT_CONFIG):
+        self.config = config
+        self.line_pages = Counter()
+        self.exact = set()
+        self.bands = [{} for _ in range(4)]
+
+    def strip_boilerplate(self, text):
+        lines = text.splitlines()
+        content = [i for i, line in enumerate(lines) if line.strip()]
+        # A page needs a body for anything to be its header or footer
+        margin = min(self.config.boilerplate_margin, len(content) // 4)
+        normalised = [""] * len(lines)
+        if margin > 0:
+            for i in content[:margin]:
+                normalised[i] = _boilerplate_key(lines[i], "top")
+            for i in content[-margin:]:
+                normalised[i] = _boilerplate_key(lines[i], "bottom")
+        for key in set(normalised):
+            if key:
+                self.line_pages[key] += 1
+        kept = [
+            line for line, key in zip(lines, normalised)
+            if not key or self.line_pages[key] <= self.config.boilerplate_pages
+        ]
+        return "\n".join(kept)
+
+    def is_duplicate(self, chunk):
+        digest = hashlib.sha1(" ".join(chunk.lower().split()).encode("utf-8")).digest()
+        if digest in self.exact:
+            return True
+        self.exact.add(digest)
+
+        fingerprint = simhash(chunk)
+        for i, band in enumerate(self.bands):
+            for other in band.get(fingerprint >> (16 * i) & 0xFFFF, ()):
+                if bin(fingerprint ^ other).count("1") <= self.config.near_duplicate_bits:
+                    return True
+        for i, band in enumerate(self.bands):
+            band.setdefault(fingerprint >> (16 * i) & 0xFFFF, []).append(fingerprint)
+        return False
+
+
+def _boilerplate_key(line, position):
+    # Only short non-heading lines can be running headers/footers. Standalone
+    # numbers are masked, digits inside words ("alpha3", "CS101") are not
+    stripped = line.strip()
+    if len(stripped) > 80 or HEADING_RE.match(stripped):
+        return ""
+    return position + ":" + NUMBER_RE.sub("#", stripped.lower())
+
+
+# ---- Entry points ----
+def chunk_page(text, config=DEFAULT_CONFIG, deduper=None):
+    """Chunks of one page; pass the same deduper for every page of a document."""
+    if deduper:
+        text = deduper.strip_boilerplate(text)
+    return [
+        chunk for chunk in pack_blocks(split_blocks(text), config)
+        if not (deduper and deduper.is_duplicate(chunk))
+    ]
+
+
+def chunk_pages(pages, config=DEFAULT_CONFIG):
+    """Yield (chunk, {"page": n}) from an iterable of (page_number, text).
+
+    Chunks never straddle pages, so every chunk keeps a single page number.
+    """
+    deduper = Deduplicator(config) if config.dedup else None
+    for page_number, text in pages:
+        for chunk in chunk_page(text, config, deduper):
+            yield chunk, {"page": page_number}
+
+
+def chunk_text(text, config=DEFAULT_CONFIG):
+    return [chunk for chunk, _ in chunk_pages([(1, text)], config)]
@@ -0,0 +1,90 @@
+import numpy as np
+
+from chunking import DEFAULT_CONFIG, Deduplicator, estimate_tokens
+from generation import RAG_CONTEXT_BUDGET
+
+
+def _unit(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.clip(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-9, None)
+
+
+def _overlap_words(left, right, max_words=80):
+    # Longest run of words ending `left` that also starts `right` (chunk overlap)
+    a, b = left.split(), right.split()
+    for n in range(min(len(a), len(b), max_words), 0, -1):
+        if a[-n:] == b[:n]:
+            return n
+    return 0
+
+
+def _document(hit):
+    return hit.get("source") or hit.get("doc_id") or ""
+
+
+def _order_key(hit):
+    return _document(hit), hit.get("page") or 0, hit.get("chunk_index") or 0
+
+
+def mmr(hits, query_vectors, k, diversity=0.3):
+    """Maximal marginal relevance order of hits that carry a "vector".
+
+    Relevance is the best cosine against any query; each pick is penalised
+    by its similarity to what is already selected.
+    """
+    if not hits:
+        return []
+    vectors = _unit([hit["vector"] for hit in hits])
+    relevance = (vectors @ _unit(query_vectors).T).max(axis=1)
+    selected, remaining = [], list(range(len(hits)))
+    while remaining and len(selected) < k:
+        if selected:
+            redundancy = (vectors[remaining] @ vectors[selected].T).max(axis=1)
+        else:
+            redundancy = np.zeros(len(remaining))
+        scores = (1 - diversity) * relevance[remaining] - diversity * redundancy
+        selected.append(remaining.pop(int(np.argmax(scores))))
+    return [hits[i] for i in selected]
+
+
+def build_context(hits, query_vectors=None, budget=RAG_CONTEXT_BUDGET, diversity=0.3,
+                  chunk_config=DEFAULT_CONFIG):
+    """Pack retrieved hits into at most `budget` tokens of prompt context.
+
+    Near-duplicates (also across documents) are dropped, the rest ranked by
+    MMR when hits carry vectors (else kept in retrieval order) and taken
+    until the budget is spent. Chunks from the same page are then merged in
+    reading order with their overlap removed. Returns (context, used_hits).
+    """
+    deduper = Deduplicator(chunk_config)
+    unique = [hit for hit in hits if not deduper.is_duplicate(hit["text"])]
+    if query_vectors is not None and unique and all("vector" in hit for hit in unique):
+        unique = mmr(unique, np.atleast_2d(query_vectors), len(unique), diversity)
+
+    used, spent = [], 0
+    for hit in unique:
+        cost = estimate_tokens(hit["text"])
+        if spent + cost > budget:
+            # A smaller chunk further down may still fit
+            continue
+        used.append(hit)
+        spent += cost
+
+    blocks = []
+    for hit in sorted(used, key=_order_key):
+        key = (_document(hit), hit.get("page"))
+        if blocks and blocks[-1][0] == key:
+            previous = blocks[-1][2]
+            overlap = _overlap_words(previous, hit["text"])
+            if overlap:
+                blocks[-1][2] = previous + " " + " ".join(hit["text"].split()[overlap:])
+            else:
+                blocks[-1][2] = previous + "\n" + hit["text"]
+        else:
+            blocks.append([key, hit.get("source"), hit["text"]])
+
+    parts = []
+    for (_, page), source, text in blocks:
+        label = ", ".join(p for p in (source, f"p. {page}" if page else None) if p)
+        parts.append(f"[{label}]\n{text}" if label else text)
+    return "\n\n".join(parts), used
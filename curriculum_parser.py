@@ -0,0 +1,357 @@
+import re
+from dataclasses import dataclass, field
+
+from chunking import trim_to_tokens
+from generation import CURRICULUM_MODEL, TokenStream
+from response_cache import cached_stream
+
+
+MARKDOWN_RE = re.compile(r"#{1,6}\s*|\*\*|\*(?=\S)|__")
+WEEK_RE = re.compile(
+    r"^\W*weeks?\s+(\d+)(?:\s*(?:-|–|—|to)\s*(\d+))?\s*(?:[:\-–—.)]\s*(.*))?$", re.IGNORECASE
+)
+FIELD_RE = re.compile(r"^\W*(topic|key concepts?|practical[^:]*|activity[^:]*)\s*:\s*(.*)$", re.IGNORECASE)
+HEADER_RE = re.compile(r"^\W*(course name|course title|course|level|duration)\s*:\s*(.*)$", re.IGNORECASE)
+BULLET_RE = re.compile(r"^\s*(?:[-•*]|\d+[.)])\s*")
+
+SECTIONS = {
+    "overview": re.compile(r"^\W*course overview\s*:?\s*(.*)$", re.IGNORECASE),
+    "weekly": re.compile(r"^\W*weekly (?:plan|breakdown)\s*:?\s*(.*)$", re.IGNORECASE),
+    "outcomes": re.compile(r"^\W*learning outcomes\s*:?\s*(.*)$", re.IGNORECASE),
+    "assessment": re.compile(r"^\W*assessment(?: strategy)?\s*:?\s*(.*)$", re.IGNORECASE),
+    "job_roles": re.compile(r"^\W*(?:relevant )?job roles\s*:?\s*(.*)$", re.IGNORECASE),
+}
+SECTION_TITLES = {
+    "outcomes": "Learning Outcomes",
+    "assessment": "Assessment Strategy",
+    "job_roles": "Relevant Job Roles",
+}
+TOPIC_SECTIONS = ("outcomes", "assessment", "job_roles")
+RAG_SECTIONS = ("outcomes", "assessment")
+SUMMARY_TEXT_BUDGET = 1500
+
+
+@dataclass
+class Week:
+    number: int
+    title: str = ""
+    topic: str = ""
+    key_concepts: str = ""
+    practical: str = ""
+    notes: list = field(default_factory=list)
+    last: int = 0  # end of a "Weeks 1-2" range; 0 for a single week
+
+    @property
+    def numbers(self):
+        return range(self.number, max(self.last, self.number) + 1)
+
+    @property
+    def label(self):
+        if self.last > self.number:
+            return f"Weeks {self.number}-{self.last}"
+        return f"Week {self.number}"
+
+    def to_markdown(self):
+        lines = [f"**{self.label}: {self.title}**" if self.title else f"**{self.label}:**"]
+        if self.topic:
+            lines.append(f"- Topic: {self.topic}")
+        if self.key_concepts:
+            lines.append(f"- Key Concepts: {self.key_concepts}")
+        if self.practical:
+            lines.append(f"- Practical / Activity Component: {self.practical}")
+        lines.extend(f"- {note}" for note in self.notes)
+        return "\n".join(lines)
+
+
+@dataclass
+class Curriculum:
+    course_name: str = ""
+    level: str = ""
+    duration: str = ""
+    overview: list = field(default_factory=list)
+    weeks: list = field(default_factory=list)
+    outcomes: list = field(default_factory=list)
+    assessment: list = field(default_factory=list)
+    job_roles: list = field(default_factory=list)
+    other: list = field(default_factory=list)  # lines outside any recognised part
+    raw: str = ""
+
+    def week(self, number):
+        """The week covering `number`, including "Weeks N-M" ranges."""
+        for week in self.weeks:
+            if number in week.numbers:
+                return week
+        return None
+
+    def week_numbers(self):
+        return {number for week in self.weeks for number in week.numbers}
+
+    def to_markdown(self, weekly_title="Weekly Plan"):
+        lines = []
+        if self.course_name:
+            lines.append(f"**Course Name:** {self.course_name}")
+        if self.level:
+            lines.append(f"**Level:** {self.level}")
+        if self.duration:
+            lines.append(f"**Duration:** {self.duration}")
+        if self.overview:
+            lines += ["", "### Course Overview", *self.overview]
+        if self.weeks:
+            lines += ["", f"### {weekly_title}"]
+            for week in self.weeks:
+                lines += ["", week.to_markdown()]
+        for name, title in SECTION_TITLES.items():
+            items = getattr(self, name)
+            if items:
+                lines += ["", f"### {title}", *(f"- {item}" for item in items)]
+        if self.other:
+            lines += ["", "### Additional Notes", *self.other]
+        return "\n".join(lines).strip()
+
+    def summary(self, budget=SUMMARY_TEXT_BUDGET):
+        """Course name, week titles and outcomes: enough context for follow-up prompts.
+
+        When no weeks could be parsed the output itself, cut to `budget`
+        tokens, stands in for the outline.
+        """
+        lines = [f"Course: {self.course_name}", f"Level: {self.level}"]
+        if not self.weeks:
+            text = self.raw.strip() or "\n".join(self.overview + self.other)
+            if text:
+                lines.append(trim_to_tokens(text, budget))
+            return "\n".join(lines)
+        lines += [f"{w.label}: {w.title or w.topic}" for w in self.weeks]
+        if self.outcomes:
+            lines.append("Learning Outcomes: " + "; ".join(self.outcomes))
+        if self.job_roles:
+            lines.append("Job Roles: " + "; ".join(self.job_roles))
+        return "\n".join(lines)
+
+
+def strip_markdown(text):
+    return MARKDOWN_RE.sub("", text)
+
+
+# ---- Parsing ----
+def _match_section(line):
+    for name, rx in SECTIONS.items():
+        match = rx.match(line)
+        if match:
+            return name, match.group(1).strip()
+    return None
+
+
+def _is_section_heading(raw_line, rest):
+    # "### Assessment Strategy", "**Assessment Strategy:** ..." or a bare
+    # "Assessment:" line, but not a week's "- Assessment: Quiz 1" bullet
+    if raw_line.startswith(("#", "**", "__")):
+        return True
+    return not BULLET_RE.match(raw_line) and not rest
+
+
+def parse_curriculum(text):
+    """Parse generated markdown into a Curriculum.
+
+    Lines that fit no recognised part are kept in `other` rather than
+    dropped. While a week is open, a section name only ends it when the
+    line is written as a heading.
+    """
+    curriculum = Curriculum(raw=text)
+    section = None
+    week = None
+
+    for raw_line in text.splitlines():
+        raw_line = raw_line.strip()
+        line = strip_markdown(raw_line).strip()
+        if not line:
+            continue
+
+        match = WEEK_RE.match(line)
+        if match:
+            number = int(match.group(1))
+            last = int(match.group(2) or 0)
+            last = last if last > number else 0
+            week = next(
+                (w for w in curriculum.weeks if (w.number, w.last) == (number, last)), None
+            ) or Week(number, last=last)
+            if week not in curriculum.weeks:
+                curriculum.weeks.append(week)
+            week.title = (match.group(3) or week.title).strip()
+            section = "weekly"
+            continue
+
+        match = _match_section(line)
+        if match and (week is None or _is_section_heading(raw_line, match[1])):
+            section, rest = match
+            week = None
+            if rest and section != "weekly":
+                getattr(curriculum, section).append(BULLET_RE.sub("", rest))
+            continue
+
+        match = HEADER_RE.match(line)
+        if match and week is None and section in (None, "overview"):
+            key, value = match.group(1).lower(), match.group(2).strip()
+            if key.startswith("course"):
+                curriculum.course_name = value
+            else:
+                setattr(curriculum, key, value)
+            continue
+
+        if week is not None:
+            match = FIELD_RE.match(line)
+            if match:
+                label, value = match.group(1).lower(), match.group(2).strip()
+                if label == "topic":
+                    week.topic = value
+                elif label.startswith("key"):
+                    week.key_concepts = value
+                else:
+                    week.practical = value
+            else:
+                week.notes.append(BULLET_RE.sub("", line))
+        elif section in ("overview", "outcomes", "assessment", "job_roles"):
+            getattr(curriculum, section).append(BULLET_RE.sub("", line))
+        else:
+            curriculum.other.append(line)
+
+    curriculum.weeks.sort(key=lambda w: w.number)
+    return curriculum
+
+
+# ---- Validation ----
+def validate_curriculum(curriculum, duration, required_sections=TOPIC_SECTIONS, week_fields=True):
+    """Return a list of (kind, detail) problems; empty when the plan is complete."""
+    issues = []
+    numbers = curriculum.week_numbers()
+    for number in range(1, duration + 1):
+        if number not in numbers:
+            issues.append(("missing_week", number))
+    for number in sorted(numbers):
+        if number > duration:
+            issues.append(("extra_week", number))
+
+    if week_fields:
+        for week in curriculum.weeks:
+            if week.number > duration:
+                continue
+            if not (week.title or week.topic) or not week.key_concepts or not week.practical:
+                issues.append(("incomplete_week", week.number))
+
+    for name in required_sections:
+        if not getattr(curriculum, name):
+            issues.append(("missing_section", name))
+    return issues
+
+
+# ---- Repair ----
+def repair_prompt(curriculum, issues, duration, context=None):
+    weeks = sorted({detail for kind, detail in issues if kind in ("missing_week", "incomplete_week")})
+    sections = [SECTION_TITLES[detail] for kind, detail in issues if kind == "missing_section"]
+
+    requests = []
+    if weeks:
+        requests.append(
+            "For each of " + ", ".join(f"Week {n}" for n in weeks) + " write:\n"
+            "    Week N: <title>\n"
+            "    - Topic:\n"
+            "    - Key Concepts:\n"
+            "    - Practical / Activity Component:"
+        )
+    for title in sections:
+        requests.append(f"{title}:\n    - (bullet points)")
+
+    grounding = ""
+    if context:
+        # Document-based plans may only use the retrieved material
+        grounding = f"""
+    Source material:
+
+    {context}
+
+    Use ONLY the source material above. Do NOT add external information.
+    If it does not cover a part, write "Not covered in the source material."
+    """
+
+    return f"""
+    Existing {duration}-week curriculum outline:
+
+    {curriculum.summary()}
+    {grounding}
+    Write ONLY the following missing parts, in exactly this format.
+    Do not repeat anything else.
+
+    """ + "\n\n    ".join(requests)
+
+
+def merge_repair(curriculum, repair, duration):
+    for week in repair.weeks:
+        if week.number > duration:
+            continue
+        existing = curriculum.week(week.number)
+        if existing is None:
+            curriculum.weeks.append(week)
+            continue
+        for name in ("title", "topic", "key_concepts", "practical"):
+            if not getattr(existing, name):
+                setattr(existing, name, getattr(week, name))
+    for name in SECTION_TITLES:
+        if not getattr(curriculum, name):
+            setattr(curriculum, name, getattr(repair, name))
+    curriculum.weeks = sorted(
+        (w for w in curriculum.weeks if w.number <= duration), key=lambda w: w.number
+    )
+    return curriculum
+
+
+def repair_curriculum(client, curriculum, duration, required_sections=TOPIC_SECTIONS,
+                      week_fields=True, attempts=1, context=None, model=CURRICULUM_MODEL,
+                      cache=None):
+    """Patch only the missing or broken parts instead of regenerating the plan.
+
+    Document-based plans pass their retrieved `context` (and RAG model) so
+    the repair stays grounded in the source. With a response `cache` the
+    repair of a given plan is generated once and replayed on later hits.
+    """
+    issues = validate_curriculum(curriculum, duration, required_sections, week_fields)
+    for _ in range(attempts):
+        if not issues:
+            break
+        fixable = [issue for issue in issues if issue[0] != "extra_week"]
+        if fixable:
+            prompt = repair_prompt(curriculum, fixable, duration, context)
+            max_tokens = 150 * len({d for k, d in fixable if k != "missing_section"}) + 120
+            stream = TokenStream(client, "repair", model, prompt, max_tokens, 0.3)
+            text = "".join(cached_stream(cache, stream)) if cache else stream.collect()
+            merge_repair(curriculum, parse_curriculum(text), duration)
+        else:
+            merge_repair(curriculum, Curriculum(), duration)
+        issues = validate_curriculum(curriculum, duration, required_sections, week_fields)
+    return curriculum, issues
+
+
+def append_repairs(text, curriculum):
+    """`text` followed by whatever a repaired `curriculum` adds to it.
+
+    The original output is kept verbatim, including lines the parser did
+    not understand; only weeks, week fields and sections it lacks are
+    appended.
+    """
+    original = parse_curriculum(text)
+    added = Curriculum()
+    for week in curriculum.weeks:
+        before = original.week(week.number)
+        if before is None:
+            added.weeks.append(week)
+            continue
+        filled = Week(week.number, before.title or week.title, last=before.last)
+        for name in ("topic", "key_concepts", "practical"):
+            if getattr(week, name) and not getattr(before, name):
+                setattr(filled, name, getattr(week, name))
+        if filled.topic or filled.key_concepts or filled.practical:
+            added.weeks.append(filled)
+    for name in SECTION_TITLES:
+        if getattr(curriculum, name) and not getattr(original, name):
+            setattr(added, name, getattr(curriculum, name))
+
+    extra = added.to_markdown(weekly_title="Weekly Plan (completed)")
+    return f"{text.rstrip()}\n\n{extra}" if extra else text
@@ -0,0 +1,381 @@
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import lancedb
+import numpy as np
+import pyarrow as pa
+
+import metrics
+
+
+DB_PATH = "lancedb"
+CORPUS_PREFIX = "chunks_"
+
+# Below this many corpus rows a brute-force scan beats an IVF_PQ index
+INDEX_MIN_ROWS = 50_000
+RRF_K = 60
+
+_connections = {}
+_connections_lock = threading.Lock()
+
+
+def get_connection(path=DB_PATH, read_consistency_interval=None):
+    # One connection per database path, reused across reruns and sessions.
+    # A read_consistency_interval makes reads see other processes' writes.
+    key = (path, read_consistency_interval)
+    with _connections_lock:
+        db = _connections.get(key)
+        if db is None:
+            db = lancedb.connect(path, read_consistency_interval=read_consistency_interval)
+            _connections[key] = db
+        return db
+
+
+def table_name(doc_id):
+    # Per-document tables from before the shared corpus table; only dropped now
+    return f"doc_{doc_id[:32]}"
+
+
+def corpus_name(dimension):
+    # One table per embedding size, so switching models never mixes vector widths
+    return f"{CORPUS_PREFIX}{int(dimension)}"
+
+
+def sql_literal(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def document_filter(doc_ids, where=None):
+    clause = f"doc_id IN ({', '.join(sql_literal(d) for d in doc_ids)})"
+    return f"{clause} AND ({where})" if where else clause
+
+
+def build_rows(doc_id, chunks, vectors, metadata=None, ids=None):
+    rows = []
+    for i, chunk in enumerate(chunks):
+        row = {
+            "id": ids[i] if ids else f"{doc_id}:{i}",
+            "doc_id": doc_id,
+            "chunk_index": i,
+            "page": None,
+            "source": None,
+            "text": chunk,
+            "vector": vectors[i],
+        }
+        if metadata:
+            row.update(metadata[i])
+        rows.append(row)
+    return rows
+
+
+def _schema(dimension):
+    return pa.schema([
+        pa.field("id", pa.string()),
+        pa.field("doc_id", pa.string()),
+        pa.field("chunk_index", pa.int64()),
+        pa.field("page", pa.int64()),
+        pa.field("source", pa.string()),
+        pa.field("text", pa.string()),
+        pa.field("vector", pa.list_(pa.float32(), int(dimension))),
+    ])
+
+
+class DocumentStore:
+    """Keeps every ingested document in one shared LanceDB corpus table.
+
+    Rows carry their doc_id, page and source; reads and deletes select a
+    document with a `doc_id IN (...)` filter backed by a bitmap index, so
+    searching the whole corpus is one query whatever the number of
+    documents. Written tables are compacted, their indexes updated and old
+    versions pruned by a background thread, which also builds the IVF_PQ
+    index once the corpus passes index_min_rows.
+    """
+
+    def __init__(self, path=DB_PATH, compact_interval=300, keep_versions=timedelta(minutes=10),
+                 index_min_rows=INDEX_MIN_ROWS, nprobes=20, read_consistency_interval=None):
+        self.db = get_connection(path, read_consistency_interval)
+        self.compact_interval = compact_interval
+        self.keep_versions = keep_versions
+        self.index_min_rows = index_min_rows
+        self.nprobes = nprobes
+        self._lock = threading.Lock()
+        self._table_locks = {}
+        self._tables = {}
+        self._dirty = set()
+        self._compactor = None
+        self._search_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="lancedb-search")
+
+    # ---- Tables ----
+    def _corpus_names(self):
+        return [name for name in self.db.table_names() if name.startswith(CORPUS_PREFIX)]
+
+    def _open(self, name):
+        table = self._tables.get(name)
+        if table is None:
+            if name not in self.db.table_names():
+                return None
+            table = self.db.open_table(name)
+            self._tables[name] = table
+        return table
+
+    def _corpora(self):
+        return [table for table in map(self._open, self._corpus_names()) if table is not None]
+
+    def has_document(self, doc_id):
+        where = document_filter([doc_id])
+        return any(table.count_rows(where) for table in self._corpora())
+
+    def _table_lock(self, name):
+        with self._lock:
+            return self._table_locks.setdefault(name, threading.Lock())
+
+    # ---- Writes ----
+    def upsert_chunks(self, doc_id, chunks, vectors, metadata=None):
+        rows = build_rows(doc_id, chunks, vectors, metadata)
+        if not rows:
+            return
+        name = corpus_name(len(rows[0]["vector"]))
+
+        with self._table_lock(name), metrics.stage("lancedb_write"):
+            table = self._open(name)
+            if table is None and self._create(name, rows):
+                return
+            (
+                self._open(name)
+                .merge_insert("id")
+                .when_matched_update_all()
+                .when_not_matched_insert_all()
+                .execute(rows)
+            )
+            self._mark_dirty(name)
+
+    def replace_pages(self, doc_id, pages, chunks, vectors, metadata, ids=None):
+        """Swap the rows of `pages` for new chunks; other pages are left untouched."""
+        rows = build_rows(doc_id, chunks, vectors, metadata, ids)
+        page_list = ", ".join(str(int(p)) for p in sorted(pages))
+        if pages:
+            for table in self._corpora():
+                with self._table_lock(table.name), metrics.stage("lancedb_write"):
+                    table.delete(document_filter([doc_id], f"page IN ({page_list})"))
+                    self._mark_dirty(table.name)
+        if not rows:
+            return
+
+        name = corpus_name(len(rows[0]["vector"]))
+        with self._table_lock(name), metrics.stage("lancedb_write"):
+            if self._open(name) is None and self._create(name, rows):
+                return
+            self._open(name).add(rows)
+            self._mark_dirty(name)
+
+    def _create(self, name, rows):
+        try:
+            table = self.db.create_table(name, data=rows, schema=_schema(len(rows[0]["vector"])))
+        except (ValueError, OSError):
+            # Created concurrently by another process
+            return False
+        self._tables[name] = table
+        _build_scalar_index(table)
+        _build_fts_index(table)
+        self._mark_dirty(name)
+        return True
+
+    def delete_document(self, doc_id):
+        for table in self._corpora():
+            with self._table_lock(table.name):
+                table.delete(document_filter([doc_id]))
+                self._mark_dirty(table.name)
+        legacy = table_name(doc_id)
+        if legacy in self.db.table_names():
+            self.db.drop_table(legacy)
+
+    # ---- Reads ----
+    def _vector_query(self, table, query_vector, k, where=None):
+        # nprobes only matters once the compactor has built an IVF_PQ index,
+        # possibly in another process; on a plain scan it is ignored
+        query = table.search(query_vector).limit(k).nprobes(self.nprobes)
+        if where:
+            query = query.where(where, prefilter=True)
+        return query.to_list()
+
+    def _vector_query_many(self, table, query_vectors, k, where=None):
+        # One batched query for all vectors; LanceDB tags each hit with its query_index
+        vectors = [np.asarray(v, dtype=np.float32) for v in query_vectors]
+        hits = self._vector_query(table, vectors, k, where)
+        grouped = [[] for _ in query_vectors]
+        for hit in hits:
+            grouped[hit.pop("query_index", 0)].append(hit)
+        return grouped
+
+    def search(self, doc_id, query_vector, k=5, where=None):
+        table = self._open(corpus_name(len(query_vector)))
+        if table is None:
+            return []
+        with metrics.stage("lancedb_search"):
+            return self._vector_query(table, query_vector, k, document_filter([doc_id], where))
+
+    def hybrid_search(self, doc_ids, query_text, query_vector, k=5, where=None):
+        """Fuse vector and full-text (BM25) hits with reciprocal rank fusion.
+
+        Searches the documents in doc_ids and ranks the union, so callers
+        can span several documents or filter down to one. `where` is a
+        LanceDB SQL filter over row metadata, e.g. page_filter(3, 10).
+        """
+        return self.hybrid_search_many(doc_ids, [query_text], [query_vector], k, where)[0]
+
+    def hybrid_search_many(self, doc_ids, query_texts, query_vectors, k=5, where=None,
+                           keep_vectors=False):
+        """hybrid_search for several queries, returning one ranked list per query.
+
+        Vector search runs as one batched query over the corpus; full-text
+        search has no batch form and runs once per query, concurrently with
+        it. keep_vectors leaves each hit's embedding in place, e.g. for MMR
+        re-ranking.
+        """
+        if isinstance(doc_ids, str):
+            doc_ids = [doc_ids]
+        if not doc_ids or not query_texts:
+            return [[] for _ in query_texts]
+        table = self._open(corpus_name(len(query_vectors[0])))
+        if table is None:
+            return [[] for _ in query_texts]
+
+        where = document_filter(doc_ids, where)
+        with metrics.stage("lancedb_search"):
+            fused = [{} for _ in query_texts]
+            candidates = max(k * 2, 10)
+            text_hits = [
+                self._search_pool.submit(_text_query, table, text, candidates, where)
+                for text in query_texts
+            ]
+            vector_hits = self._vector_query_many(table, query_vectors, candidates, where)
+            for i, text_future in enumerate(text_hits):
+                for hits in (vector_hits[i], text_future.result()):
+                    for rank, hit in enumerate(hits):
+                        entry = fused[i].setdefault(hit["id"], dict(hit, _score=0.0))
+                        entry["_score"] += 1.0 / (RRF_K + rank + 1)
+
+        results = []
+        for hits in fused:
+            ranked = sorted(hits.values(), key=lambda hit: hit["_score"], reverse=True)
+            if not keep_vectors:
+                for hit in ranked:
+                    hit.pop("vector", None)
+            results.append(ranked[:k])
+        return results
+
+    # ---- Maintenance ----
+    def _mark_dirty(self, name):
+        with self._lock:
+            self._dirty.add(name)
+            if self._compactor is None:
+                self._compactor = threading.Thread(
+                    target=self._compact_loop, name="lancedb-compactor", daemon=True
+                )
+                self._compactor.start()
+
+    def _compact_loop(self):
+        while True:
+            time.sleep(self.compact_interval)
+            self.compact()
+
+    def compact(self):
+        with self._lock:
+            names = list(self._dirty)
+            self._dirty.clear()
+
+        for name in names:
+            with self._table_lock(name):
+                table = self._tables.get(name)
+                if table is None:
+                    continue
+                try:
+                    self._ensure_indexes(table)
+                    # Also folds rows written since into the existing indexes
+                    _optimize(table, self.keep_versions)
+                except Exception:
+                    # Conflicting writer or dropped table; retry on the next pass
+                    with self._lock:
+                        self._dirty.add(name)
+
+    def _ensure_indexes(self, table):
+        indexed = _indexed_columns(table)
+        if "doc_id" not in indexed:
+            _build_scalar_index(table)
+        if "text" not in indexed:
+            _build_fts_index(table)
+        if "vector" in indexed:
+            return
+        rows = table.count_rows()
+        if rows < self.index_min_rows:
+            return
+        # MiniLM vectors are unit-normalised, so the default L2 metric ranks
+        # like cosine and matches the metric plain searches use
+        table.create_index(
+            num_partitions=max(1, int(math.sqrt(rows))),
+            num_sub_vectors=_sub_vectors(table),
+            replace=True,
+        )
+
+
+def page_filter(start=None, end=None):
+    clauses = []
+    if start is not None:
+        clauses.append(f"page >= {int(start)}")
+    if end is not None:
+        clauses.append(f"page <= {int(end)}")
+    return " AND ".join(clauses) or None
+
+
+def _text_query(table, query_text, limit, where=None):
+    try:
+        query = table.search(query_text, query_type="fts").limit(limit)
+        if where:
+            query = query.where(where, prefilter=True)
+        return query.to_list()
+    except Exception:
+        # No FTS index yet (or query syntax the index rejects)
+        return []
+
+
+def _sub_vectors(table):
+    # PQ sub-vectors must divide the dimension; aim for 8 dims per sub-vector
+    dim = table.schema.field("vector").type.list_size
+    for n in (dim // 8, dim // 4, dim // 2, 1):
+        if n and dim % n == 0:
+            return n
+    return 1
+
+
+def _indexed_columns(table):
+    try:
+        return {column for index in table.list_indices() for column in index.columns}
+    except Exception:
+        return set()
+
+
+def _build_scalar_index(table):
+    try:
+        table.create_scalar_index("doc_id", index_type="BITMAP", replace=True)
+    except Exception:
+        # Filters still work without it, just by scanning
+        pass
+
+
+def _build_fts_index(table):
+    try:
+        table.create_fts_index("text", replace=True)
+    except Exception:
+        # Full-text search is optional; hybrid_search falls back to vectors
+        pass
+
+
+def _optimize(table, keep_versions):
+    if hasattr(table, "optimize"):
+        table.optimize(cleanup_older_than=keep_versions)
+    else:
+        table.compact_files()
+        table.cleanup_old_versions(older_than=keep_versions)
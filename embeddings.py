@@ -0,0 +1,289 @@
+import argparse
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import warnings
+
+import numpy as np
+
+import metrics
+
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+HF_MODEL_ID = f"sentence-transformers/{MODEL_NAME}"
+CACHE_DIR = ".cache"
+BACKEND_ENV = "CURRICUFORGE_EMBEDDING_BACKEND"
+FLOAT16_ENV = "CURRICUFORGE_VECTOR_CACHE_FLOAT16"
+CACHE_ENTRIES_ENV = "CURRICUFORGE_VECTOR_CACHE_MAX_ENTRIES"
+CACHE_AGE_ENV = "CURRICUFORGE_VECTOR_CACHE_MAX_AGE_DAYS"
+
+
+def _length_sorted_batches(texts, batch_size):
+    # Similar lengths per batch means less padding per forward pass
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    for start in range(0, len(order), batch_size):
+        yield order[start:start + batch_size]
+
+
+def _encode_sorted(texts, batch_size, encode_batch):
+    vectors = [None] * len(texts)
+    for batch in _length_sorted_batches(texts, batch_size):
+        for i, vector in zip(batch, encode_batch([texts[i] for i in batch])):
+            vectors[i] = vector
+    return np.asarray(vectors, dtype=np.float32)
+
+
+# ---- Backends ----
+class SentenceTransformerBackend:
+
+    def __init__(self, model_name=MODEL_NAME, batch_size=64, device="cpu"):
+        from sentence_transformers import SentenceTransformer
+
+        self.name = f"torch:{model_name}"
+        self.batch_size = batch_size
+        self.model = SentenceTransformer(model_name, device=device)
+        self.dimension = self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts):
+        return _encode_sorted(
+            texts,
+            self.batch_size,
+            lambda batch: self.model.encode(batch, batch_size=len(batch)),
+        )
+
+
+class OnnxBackend:
+    """all-MiniLM-L6-v2 exported to ONNX with dynamic int8 quantisation.
+
+    Needs the optional `optimum[onnxruntime]` extra. The quantised model is
+    exported once into .cache/onnx and reused afterwards.
+    """
+
+    def __init__(self, model_id=HF_MODEL_ID, batch_size=64, max_length=256, cache_dir=CACHE_DIR):
+        from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+        from optimum.onnxruntime.configuration import AutoQuantizationConfig
+        from transformers import AutoTokenizer
+
+        self.name = f"onnx-int8:{model_id.split('/')[-1]}"
+        self.batch_size = batch_size
+        self.max_length = max_length
+
+        export_dir = os.path.join(cache_dir, "onnx", model_id.replace("/", "__"))
+        quantized_dir = os.path.join(export_dir, "int8")
+        if not os.path.isdir(quantized_dir):
+            model = ORTModelForFeatureExtraction.from_pretrained(model_id, export=True)
+            model.save_pretrained(export_dir)
+            quantizer = ORTQuantizer.from_pretrained(export_dir)
+            quantizer.quantize(
+                save_dir=quantized_dir,
+                quantization_config=AutoQuantizationConfig.avx2(is_static=False, per_channel=False),
+            )
+            AutoTokenizer.from_pretrained(model_id).save_pretrained(quantized_dir)
+
+        self.tokenizer = AutoTokenizer.from_pretrained(quantized_dir)
+        self.model = ORTModelForFeatureExtraction.from_pretrained(
+            quantized_dir, file_name="model_quantized.onnx"
+        )
+        self.dimension = self.model.config.hidden_size
+
+    def _encode_batch(self, batch):
+        inputs = self.tokenizer(
+            batch, padding=True, truncation=True, max_length=self.max_length, return_tensors="np"
+        )
+        hidden = self.model(**inputs).last_hidden_state
+        # Mean pooling + L2 normalisation, as in the sentence-transformers model
+        mask = inputs["attention_mask"][..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled / np.linalg.norm(pooled, axis=1, keepdims=True)
+
+    def encode(self, texts):
+        return _encode_sorted(texts, self.batch_size, self._encode_batch)
+
+
+# ---- Vector cache ----
+class VectorCache:
+    """Persistent text-hash -> vector store in SQLite.
+
+    With float16=True vectors are stored at half precision, halving memory
+    and disk; they are returned as float32 either way. Entries unused for
+    `max_age_days` are dropped, and past `max_entries` the least recently
+    used go first; both are checked on open and every `prune_every` writes.
+    """
+
+    def __init__(self, path=os.path.join(CACHE_DIR, "vectors.sqlite"), float16=False,
+                 max_entries=None, max_age_days=None, prune_every=1000):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.dtype = np.float16 if float16 else np.float32
+        self.max_entries = max_entries or int(os.getenv(CACHE_ENTRIES_ENV, "200000"))
+        self.max_age_days = max_age_days or float(os.getenv(CACHE_AGE_ENV, "30"))
+        self.prune_every = prune_every
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS vectors "
+            "(key TEXT PRIMARY KEY, dtype TEXT, data BLOB, used REAL)"
+        )
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(vectors)")]
+        if "used" not in columns:
+            # Caches written before eviction existed count as used now
+            with self._conn:
+                self._conn.execute("ALTER TABLE vectors ADD COLUMN used REAL")
+                self._conn.execute("UPDATE vectors SET used = ?", (time.time(),))
+        self._conn.execute("CREATE INDEX IF NOT EXISTS vectors_used ON vectors (used)")
+        with self._lock:
+            self._prune()
+
+    @staticmethod
+    def key(model_name, text):
+        return hashlib.sha1(f"{model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys):
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, dtype, data FROM vectors WHERE key IN ({','.join('?' * len(batch))})",
+                    batch,
+                ).fetchall()
+                for key, dtype, data in rows:
+                    found[key] = np.frombuffer(data, dtype=dtype).astype(np.float32)
+            if found:
+                with self._conn:
+                    self._conn.executemany(
+                        "UPDATE vectors SET used = ? WHERE key = ?",
+                        [(time.time(), key) for key in found],
+                    )
+        return found
+
+    def put_many(self, items):
+        dtype = np.dtype(self.dtype).name
+        now = time.time()
+        rows = [(key, dtype, np.asarray(v, dtype=self.dtype).tobytes(), now) for key, v in items]
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO vectors (key, dtype, data, used) VALUES (?, ?, ?, ?)",
+                    rows,
+                )
+            self._writes += len(rows)
+            if self._writes >= self.prune_every:
+                self._prune()
+
+    def _prune(self):
+        self._writes = 0
+        with self._conn:
+            expired = self._conn.execute(
+                "DELETE FROM vectors WHERE used < ?", (time.time() - self.max_age_days * 86400,)
+            ).rowcount
+            count = self._conn.execute("SELECT COUNT(*) FROM vectors").fetchone()[0]
+            if count > self.max_entries:
+                # Down to 90% so the next few writes do not prune again
+                excess = count - int(self.max_entries * 0.9)
+                self._conn.execute(
+                    "DELETE FROM vectors WHERE key IN "
+                    "(SELECT key FROM vectors ORDER BY used LIMIT ?)",
+                    (excess,),
+                )
+                expired += excess
+        metrics.inc("vector_cache_evictions_total", expired)
+
+
+# ---- Embedder ----
+class Embedder:
+    """Backend + vector cache behind a SentenceTransformer-like encode()."""
+
+    def __init__(self, backend, cache=None):
+        self.backend = backend
+        self.cache = cache
+        self.name = backend.name
+        self.dimension = backend.dimension
+
+    def encode(self, texts):
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        if not texts:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        if self.cache is None:
+            with metrics.stage("embed_encode"):
+                vectors = self.backend.encode(texts)
+            metrics.inc("embedded_texts_total", len(texts))
+            return vectors[0] if single else vectors
+
+        keys = [VectorCache.key(self.name, text) for text in texts]
+        found = self.cache.get_many(list(set(keys)))
+        missing = list({key: text for key, text in zip(keys, texts) if key not in found}.items())
+        metrics.inc("cache_requests_total", len(texts) - len(missing), cache="vector", result="hit")
+        metrics.inc("cache_requests_total", len(missing), cache="vector", result="miss")
+        if missing:
+            with metrics.stage("embed_encode"):
+                encoded = self.backend.encode([text for _, text in missing])
+            metrics.inc("embedded_texts_total", len(missing))
+            fresh = [(key, vector) for (key, _), vector in zip(missing, encoded)]
+            self.cache.put_many(fresh)
+            found.update(fresh)
+
+        vectors = np.asarray([found[key] for key in keys], dtype=np.float32)
+        return vectors[0] if single else vectors
+
+
+def load_backend(kind=None, batch_size=64):
+    kind = kind or os.getenv(BACKEND_ENV, "auto")
+    if kind in ("onnx", "auto"):
+        try:
+            return OnnxBackend(batch_size=batch_size)
+        except Exception as exc:
+            # Missing extra, failed export or unloadable model: degrade in auto mode
+            if kind == "onnx":
+                raise
+            metrics.inc("embedding_backend_fallbacks_total", backend="onnx")
+            warnings.warn(f"ONNX embedding backend unavailable ({type(exc).__name__}: {exc}); "
+                          "using sentence-transformers", RuntimeWarning)
+    return SentenceTransformerBackend(batch_size=batch_size)
+
+
+def load_embedder(kind=None, batch_size=64, use_cache=True, float16=None):
+    if float16 is None:
+        float16 = os.getenv(FLOAT16_ENV) == "1"
+    cache = VectorCache(float16=float16) if use_cache else None
+    return Embedder(load_backend(kind, batch_size), cache)
+
+
+def parity_check(candidate, reference, texts, min_cosine=0.98):
+    """Compare two backends on texts; vectors are unit-normalised so dot = cosine."""
+    a = np.asarray(candidate.encode(texts), dtype=np.float32)
+    b = np.asarray(reference.encode(texts), dtype=np.float32)
+    a /= np.linalg.norm(a, axis=1, keepdims=True)
+    b /= np.linalg.norm(b, axis=1, keepdims=True)
+    cosines = (a * b).sum(axis=1)
+    return {
+        "min_cosine": float(cosines.min()),
+        "mean_cosine": float(cosines.mean()),
+        "passed": bool(cosines.min() >= min_cosine),
+    }
+
+
+PARITY_TEXTS = [
+    "Week 1: Introduction to Machine Learning and supervised learning",
+    "Assessment Strategy: continuous assessment with weekly quizzes",
+    "Learning Outcomes: apply gradient descent to regression problems",
+    "Relevant Job Roles: Data Scientist, ML Engineer, Research Assistant",
+    "Practical: build a CNN image classifier with PyTorch",
+]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check an embedding backend against the PyTorch model")
+    parser.add_argument("--backend", default="onnx")
+    parser.add_argument("--min-cosine", type=float, default=0.98)
+    args = parser.parse_args()
+
+    result = parity_check(
+        load_backend(args.backend), SentenceTransformerBackend(), PARITY_TEXTS, args.min_cosine
+    )
+    print(result)
+    raise SystemExit(0 if result["passed"] else 1)
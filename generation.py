@@ -0,0 +1,500 @@
+import math
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import metrics
+from chunking import estimate_tokens
+
+
+CURRICULUM_MODEL = "meta-llama/Meta-Llama-3-8B-Instruct"
+RAG_MODEL = "mistralai/Mistral-7B-Instruct-v0.2"
+
+# Prompt + completion tokens each model accepts
+MODEL_CONTEXT_WINDOWS = {
+    CURRICULUM_MODEL: 8192,
+    RAG_MODEL: 32768,
+}
+
+# RAG context beyond this rarely improves the plan but always costs latency
+RAG_CONTEXT_BUDGET = 1800
+RAG_OUTPUT_BASE = 400
+RAG_OUTPUT_PER_WEEK = 110
+RAG_MAX_OUTPUT = 3072
+# estimate_tokens is a regex approximation; keep headroom for the real tokenizer
+TOKEN_SAFETY = 1.15
+
+# Programs this long are generated as an outline plus parallel week blocks
+SECTIONED_MIN_WEEKS = 16
+WEEKS_PER_BLOCK = 4
+
+# Most recent GenerationStats, newest last
+RECENT_STATS = deque(maxlen=200)
+_stats_lock = threading.Lock()
+
+
+class GenerationCancelled(Exception):
+    pass
+
+
+class GenerationStats:
+
+    def __init__(self, name, model):
+        self.name = name
+        self.model = model
+        self.started = time.perf_counter()
+        self.first_token_at = None
+        self.finished = None
+        self.tokens = 0
+        self.cancelled = False
+
+    @property
+    def time_to_first_token(self):
+        if self.first_token_at is None:
+            return None
+        return self.first_token_at - self.started
+
+    @property
+    def tokens_per_second(self):
+        if self.first_token_at is None or self.finished is None:
+            return None
+        elapsed = self.finished - self.first_token_at
+        return self.tokens / elapsed if elapsed > 0 else None
+
+    def as_dict(self):
+        return {
+            "name": self.name,
+            "model": self.model,
+            "tokens": self.tokens,
+            "ttft_s": self.time_to_first_token,
+            "tokens_per_s": self.tokens_per_second,
+            "total_s": None if self.finished is None else self.finished - self.started,
+            "cancelled": self.cancelled,
+        }
+
+
+def _record(stats, count_tokens=True):
+    with _stats_lock:
+        RECENT_STATS.append(stats)
+    labels = {"call": stats.name}
+    metrics.observe("stage_seconds", stats.finished - stats.started, stage="llm", **labels)
+    if stats.time_to_first_token is not None:
+        metrics.observe("llm_ttft_seconds", stats.time_to_first_token, **labels)
+    if count_tokens:
+        # Sectioned runs are counted through their per-block TokenStreams
+        metrics.inc("llm_completion_tokens_total", stats.tokens, **labels)
+    if stats.cancelled:
+        metrics.inc("llm_cancelled_total", **labels)
+
+
+class TokenStream:
+    """Iterate over the text deltas of a streamed chat completion.
+
+    `should_cancel` is polled between tokens; returning True closes the
+    upstream stream and raises GenerationCancelled. Timing is recorded in
+    `stats` and appended to RECENT_STATS when the stream ends.
+    """
+
+    def __init__(self, client, name, model, prompt, max_tokens, temperature=None, should_cancel=None):
+        self.client = client
+        self.model = model
+        self.prompt = prompt
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.should_cancel = should_cancel
+        self.stats = GenerationStats(name, model)
+        self.parts = []
+
+    @property
+    def text(self):
+        return "".join(self.parts)
+
+    def __iter__(self):
+        metrics.inc("llm_requests_total", call=self.stats.name)
+        metrics.inc("llm_prompt_tokens_total", estimate_tokens(self.prompt), call=self.stats.name)
+        try:
+            stream = self.client.chat_completion(
+                model=self.model,
+                messages=[{"role": "user", "content": self.prompt}],
+                max_tokens=self.max_tokens,
+                temperature=self.temperature,
+                stream=True,
+            )
+        except Exception:
+            metrics.inc("upstream_errors_total", call=self.stats.name)
+            raise
+        try:
+            for chunk in stream:
+                if self.should_cancel and self.should_cancel():
+                    self.stats.cancelled = True
+                    raise GenerationCancelled(self.stats.name)
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if not delta:
+                    continue
+                if self.stats.first_token_at is None:
+                    self.stats.first_token_at = time.perf_counter()
+                self.stats.tokens += 1
+                self.parts.append(delta)
+                yield delta
+        except GeneratorExit:
+            # Consumer stopped early, e.g. a Streamlit rerun after an input change
+            self.stats.cancelled = True
+            raise
+        except GenerationCancelled:
+            raise
+        except Exception:
+            metrics.inc("upstream_errors_total", call=self.stats.name)
+            raise
+        finally:
+            close = getattr(stream, "close", None)
+            if close:
+                close()
+            self.stats.finished = time.perf_counter()
+            _record(self.stats)
+
+    def collect(self):
+        for _ in self:
+            pass
+        return self.text
+
+
+# ---- Prompts ----
+def curriculum_prompt(topic, academic_level, duration, program_focus, evaluation_framework):
+    return f"""
+    Create a structured {duration}-week university curriculum.
+
+    Course Title: {topic}
+    Academic Level: {academic_level}
+    Program Focus: {program_focus}
+    Evaluation Framework: {evaluation_framework}
+
+    STRICT REQUIREMENTS:
+
+    1. The course MUST be exactly {duration} weeks.
+    2. Provide a weekly breakdown from Week 1 to Week {duration}.
+    3. Do NOT exceed or reduce the number of weeks.
+    4. Each week must contain:
+       - Topic
+       - Key Concepts
+       - Practical / Activity Component
+    5. After weekly plan include:
+       - Learning Outcomes (max 4 bullet points)
+       - Assessment Strategy aligned to {evaluation_framework}
+       - Relevant Job Roles (max 3 roles)
+    6. No introduction paragraph.
+    7. No repetition.
+    8. Follow clean structured format.
+
+    Format:
+
+    Course Name:
+    Level:
+    Duration: {duration} Weeks
+
+    Weekly Plan:
+    Week 1:
+    Week 2:
+    ...
+    Week {duration}:
+
+    Learning Outcomes:
+    -
+    -
+
+    Assessment Strategy:
+    -
+
+    Relevant Job Roles:
+    -
+    """
+
+
+def outline_prompt(topic, academic_level, duration, program_focus, evaluation_framework):
+    return f"""
+    Create a concise outline for a {duration}-week university curriculum.
+
+    Course Title: {topic}
+    Academic Level: {academic_level}
+    Program Focus: {program_focus}
+    Evaluation Framework: {evaluation_framework}
+
+    Give ONE short title line per week, from Week 1 to Week {duration}.
+    No introduction paragraph. Follow exactly this format:
+
+    Course Name:
+    Level:
+    Duration: {duration} Weeks
+
+    Week 1: <title>
+    ...
+    Week {duration}: <title>
+
+    Learning Outcomes:
+    - (max 4 bullet points)
+
+    Assessment Strategy:
+    - aligned to {evaluation_framework}
+
+    Relevant Job Roles:
+    - (max 3 roles)
+    """
+
+
+def week_block_prompt(outline, start, end):
+    return f"""
+    Course outline:
+
+    {outline}
+
+    Expand ONLY Week {start} to Week {end} of this outline.
+    For each of those weeks write:
+
+    Week N: <title from the outline>
+    - Topic:
+    - Key Concepts:
+    - Practical / Activity Component:
+
+    No introduction, no summary and no other weeks.
+    """
+
+
+def rag_prompt(context, duration):
+    return f"""
+            You are an academic curriculum restructuring engine.
+
+            Use ONLY the following retrieved sections:
+
+            {context}
+
+            Restructure this into a structured {duration}-week academic course plan.
+            Include:
+            - Course Overview
+            - Weekly Breakdown
+            - Learning Outcomes
+            - Assessment Strategy
+
+            Do NOT add external information.
+            """
+
+
+def roadmap_prompt(curriculum):
+    return f"""
+            Based on the following curriculum:
+
+            {curriculum}
+
+            Generate a structured 1-year career roadmap.
+
+            Requirements:
+            - Divide into 4 clear phases
+            - Include skills to focus on
+            - Include practical projects
+            - Include career milestones
+            - Keep response concise and structured
+            """
+
+
+def mentor_prompt(context, question, history=""):
+    history_block = f"""
+            Conversation so far:
+            {history}
+""" if history else ""
+    return f"""
+            You are an academic AI mentor.
+
+            Curriculum:
+            {context}
+{history_block}
+            Question:
+            {question}
+
+            Give a concise and structured response.
+            """
+
+
+# ---- Sectioned generation ----
+def split_outline(outline):
+    """Split an outline into (header, tail) around its week lines."""
+    lines = outline.strip().splitlines()
+    week_rows = [i for i, line in enumerate(lines) if re.match(r"\W*week\s+\d+", line, re.I)]
+    tail_rows = [i for i, line in enumerate(lines) if re.search(r"learning outcomes", line, re.I)]
+    first_week = week_rows[0] if week_rows else len(lines)
+    tail_start = tail_rows[-1] if tail_rows else len(lines)
+    header = [line for line in lines[:first_week] if not re.search(r"weekly plan", line, re.I)]
+    return "\n".join(header).strip(), "\n".join(lines[tail_start:]).strip()
+
+
+def missing_weeks(text, start, end):
+    return [
+        week for week in range(start, end + 1)
+        if not re.search(rf"\bweek\s+{week}\b", text, re.I)
+    ]
+
+
+class SectionedStream:
+    """Outline first, then blocks of weeks generated concurrently.
+
+    Quacks like TokenStream, so the UI and response cache treat both alike.
+    Blocks are yielded in week order as they finish; a block missing any of
+    its weeks, or whose stream failed, is regenerated on its own, up to
+    `retries` times.
+    """
+
+    def __init__(self, client, topic, academic_level, duration, program_focus, evaluation_framework,
+                 should_cancel=None, block_size=WEEKS_PER_BLOCK, max_workers=4, retries=2):
+        self.client = client
+        self.name = "sectioned_curriculum"
+        self.model = CURRICULUM_MODEL
+        self.duration = duration
+        self.prompt = "sectioned:" + outline_prompt(
+            topic, academic_level, duration, program_focus, evaluation_framework
+        )
+        self.max_tokens = 1800
+        self.temperature = 0.3
+        self.should_cancel = should_cancel
+        self.block_size = block_size
+        self.max_workers = max_workers
+        self.retries = retries
+        self.stats = GenerationStats(self.name, self.model)
+        self.parts = []
+        self._stop = threading.Event()
+
+    @property
+    def text(self):
+        return "".join(self.parts)
+
+    def _check_cancel(self):
+        if self.should_cancel and self.should_cancel():
+            self.stats.cancelled = True
+            self._stop.set()
+            raise GenerationCancelled(self.name)
+
+    def _emit(self, text):
+        if self.stats.first_token_at is None:
+            self.stats.first_token_at = time.perf_counter()
+        self.parts.append(text)
+        return text
+
+    def _generate_block(self, outline, start, end):
+        text = ""
+        error = None
+        for _ in range(self.retries + 1):
+            stream = TokenStream(
+                self.client, f"weeks_{start}_{end}", self.model,
+                week_block_prompt(outline, start, end), 130 * (end - start + 1),
+                self.temperature, self._stop.is_set,
+            )
+            try:
+                attempt = stream.collect()
+            except GenerationCancelled:
+                raise
+            except Exception as exc:
+                # A stream that broke mid-answer costs this block a retry, not the whole plan
+                error = exc
+                continue
+            finally:
+                self.stats.tokens += stream.stats.tokens
+            text, error = attempt, None
+            if not missing_weeks(text, start, end):
+                break
+        if error is not None and not text:
+            raise error
+        return text.strip()
+
+    def __iter__(self):
+        pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            outline_stream = TokenStream(
+                self.client, "outline", self.model, self.prompt[len("sectioned:"):],
+                60 + 25 * self.duration, self.temperature, self.should_cancel,
+            )
+            outline = outline_stream.collect()
+            self.stats.tokens += outline_stream.stats.tokens
+            header, tail = split_outline(outline)
+            yield self._emit(header + "\n\nWeekly Plan:\n\n")
+
+            blocks = [
+                (start, min(start + self.block_size - 1, self.duration))
+                for start in range(1, self.duration + 1, self.block_size)
+            ]
+            futures = [pool.submit(self._generate_block, outline, *block) for block in blocks]
+            for future in futures:
+                while not wait([future], timeout=0.25).done:
+                    self._check_cancel()
+                yield self._emit(future.result() + "\n\n")
+
+            if tail:
+                yield self._emit(tail)
+        except GeneratorExit:
+            self.stats.cancelled = True
+            raise
+        finally:
+            self._stop.set()
+            pool.shutdown(wait=False, cancel_futures=True)
+            self.stats.finished = time.perf_counter()
+            _record(self.stats, count_tokens=False)
+
+    def collect(self):
+        for _ in self:
+            pass
+        return self.text
+
+
+# ---- Call sites ----
+def stream_curriculum(client, topic, academic_level, duration, program_focus, evaluation_framework,
+                      should_cancel=None):
+    prompt = curriculum_prompt(topic, academic_level, duration, program_focus, evaluation_framework)
+    return TokenStream(client, "curriculum", CURRICULUM_MODEL, prompt, 1800, 0.3, should_cancel)
+
+
+def stream_sectioned_curriculum(client, topic, academic_level, duration, program_focus,
+                                evaluation_framework, should_cancel=None):
+    return SectionedStream(client, topic, academic_level, duration, program_focus,
+                           evaluation_framework, should_cancel)
+
+
+# ---- Token budgets ----
+def rag_output_tokens(duration):
+    return min(RAG_MAX_OUTPUT, RAG_OUTPUT_BASE + RAG_OUTPUT_PER_WEEK * duration)
+
+
+def rag_context_budget(duration, model=RAG_MODEL, cap=RAG_CONTEXT_BUDGET):
+    """Context tokens that leave room for the prompt template and the full answer."""
+    window = MODEL_CONTEXT_WINDOWS.get(model, 8192)
+    template = estimate_tokens(rag_prompt("", duration))
+    room = int(window / TOKEN_SAFETY) - template - rag_output_tokens(duration)
+    return max(0, min(cap, room))
+
+
+def rag_max_tokens(prompt, duration, model=RAG_MODEL):
+    """What the plan needs, within what the model window has left after `prompt`."""
+    window = MODEL_CONTEXT_WINDOWS.get(model, 8192)
+    remaining = window - math.ceil(estimate_tokens(prompt) * TOKEN_SAFETY)
+    return max(1, min(rag_output_tokens(duration), remaining))
+
+
+def stream_rag_curriculum(client, context, duration, should_cancel=None):
+    prompt = rag_prompt(context, duration)
+    return TokenStream(client, "rag_curriculum", RAG_MODEL, prompt,
+                       rag_max_tokens(prompt, duration), should_cancel=should_cancel)
+
+
+def stream_roadmap(client, curriculum, should_cancel=None):
+    return TokenStream(client, "roadmap", CURRICULUM_MODEL, roadmap_prompt(curriculum), 800, 0.4,
+                       should_cancel)
+
+
+def stream_mentor(client, context, question, history="", should_cancel=None):
+    return TokenStream(client, "mentor", CURRICULUM_MODEL, mentor_prompt(context, question, history),
+                       400, 0.3, should_cancel)
+
+
+def generate_curriculum(client, topic, academic_level, duration, program_focus, evaluation_framework):
+    factory = stream_sectioned_curriculum if duration >= SECTIONED_MIN_WEEKS else stream_curriculum
+    return factory(
+        client, topic, academic_level, duration, program_focus, evaluation_framework
+    ).collect()
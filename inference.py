@@ -0,0 +1,231 @@
+import asyncio
+import os
+import random
+import threading
+import time
+
+import metrics
+from generation import CURRICULUM_MODEL, RAG_MODEL
+
+
+LOCAL_URL_ENV = "CURRICUFORGE_LOCAL_LLM_URL"
+LOCAL_MODEL_ENV = "CURRICUFORGE_LOCAL_LLM_MODEL"
+LOCAL_KEY_ENV = "CURRICUFORGE_LOCAL_LLM_KEY"
+CONCURRENCY_ENV = "CURRICUFORGE_LLM_CONCURRENCY"
+
+# Tried, in order, when the requested model fails on every Hugging Face endpoint
+FALLBACK_MODELS = {
+    CURRICULUM_MODEL: [RAG_MODEL],
+    RAG_MODEL: [CURRICULUM_MODEL],
+}
+
+# Client errors that another attempt on the same route cannot fix
+NON_RETRYABLE_STATUS = {400, 401, 403, 404, 413, 422}
+
+
+class Endpoint:
+    """One upstream server: the Hugging Face API or an OpenAI-compatible URL.
+
+    An endpoint with a fixed `model` (e.g. a local llama.cpp or vLLM server)
+    serves every request with that model, whatever was asked for. After a
+    failure it is tried last for `cooldown` seconds.
+    """
+
+    def __init__(self, name, base_url=None, token=None, model=None, cooldown=30.0):
+        self.name = name
+        self.base_url = base_url
+        self.token = token
+        self.model = model
+        self.cooldown = cooldown
+        self.failed_until = 0.0
+        self._client = None
+
+    @property
+    def healthy(self):
+        return time.monotonic() >= self.failed_until
+
+    def mark_failed(self):
+        self.failed_until = time.monotonic() + self.cooldown
+
+    def client(self):
+        # Built on the gateway loop and reused, so HTTP connections are pooled
+        if self._client is None:
+            from huggingface_hub import AsyncInferenceClient
+
+            self._client = AsyncInferenceClient(base_url=self.base_url, token=self.token)
+        return self._client
+
+
+def _status(exc):
+    response = getattr(exc, "response", None)
+    return getattr(response, "status_code", None)
+
+
+def _retryable(exc):
+    return _status(exc) not in NON_RETRYABLE_STATUS
+
+
+class InferenceGateway:
+    """Async, pooled access to the chat models with timeouts and fallback.
+
+    All calls run on one background event loop with a process-wide
+    concurrency limit. Each call tries its routes in order: the requested
+    model on every endpoint, then FALLBACK_MODELS, then fixed-model
+    endpoints such as a local server. A route is retried with jittered
+    exponential backoff on errors and on `timeout` before the first token.
+    Once tokens have been streamed a failure is raised as-is, since
+    switching models mid-answer would splice two different texts.
+
+    chat_completion() mirrors InferenceClient, so TokenStream and the batch
+    runner use the gateway unchanged; stream() and complete() are the async
+    equivalents.
+    """
+
+    def __init__(self, endpoints, fallback_models=None, max_concurrency=8, timeout=30.0,
+                 stream_timeout=60.0, retries=2, base_delay=0.5, max_delay=8.0):
+        self.endpoints = endpoints
+        self.fallback_models = fallback_models or {}
+        self.timeout = timeout
+        self.stream_timeout = stream_timeout
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(
+            target=self._loop.run_forever, name="inference-loop", daemon=True
+        ).start()
+
+    # ---- Sync facade ----
+    def chat_completion(self, model, messages, max_tokens=None, temperature=None, stream=False):
+        kwargs = {"messages": messages, "max_tokens": max_tokens, "temperature": temperature}
+        if stream:
+            return _SyncStream(self, self.stream(model, **kwargs))
+        return self._run(self.complete(model, **kwargs))
+
+    def _run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def close(self):
+        for endpoint in self.endpoints:
+            if endpoint._client is not None:
+                self._run(endpoint._client.close())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+    # ---- Routing ----
+    def routes(self, model):
+        models = [model, *self.fallback_models.get(model, [])]
+        routes = [(e, m) for m in models for e in self.endpoints if e.model is None]
+        routes += [(e, e.model) for e in self.endpoints if e.model is not None]
+        # Endpoints cooling down after a failure go last rather than being skipped
+        return sorted(routes, key=lambda route: not route[0].healthy)
+
+    async def _attempts(self, model, call):
+        """Run call(endpoint, model) over the routes until one succeeds."""
+        last_error = None
+        for position, (endpoint, route_model) in enumerate(self.routes(model)):
+            if position:
+                metrics.inc("inference_fallbacks_total", endpoint=endpoint.name, model=route_model)
+            for attempt in range(self.retries + 1):
+                try:
+                    return await call(endpoint, route_model)
+                except Exception as exc:
+                    last_error = exc
+                    kind = "timeout" if isinstance(exc, TimeoutError) else "error"
+                    metrics.inc("inference_failures_total", endpoint=endpoint.name, kind=kind)
+                    if attempt == self.retries or not _retryable(exc):
+                        break
+                    delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+                    await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+            if _retryable(last_error):
+                # A bad request or unknown model says nothing about the endpoint's health
+                endpoint.mark_failed()
+        raise last_error or RuntimeError(f"no inference route for {model}")
+
+    # ---- Async API ----
+    async def complete(self, model, messages, max_tokens=None, temperature=None):
+        async def call(endpoint, route_model):
+            return await asyncio.wait_for(
+                endpoint.client().chat_completion(
+                    messages, model=route_model, max_tokens=max_tokens, temperature=temperature
+                ),
+                self.timeout,
+            )
+
+        async with self._semaphore:
+            return await self._attempts(model, call)
+
+    async def stream(self, model, messages, max_tokens=None, temperature=None):
+        async def call(endpoint, route_model):
+            chunks = await asyncio.wait_for(
+                endpoint.client().chat_completion(
+                    messages, model=route_model, max_tokens=max_tokens,
+                    temperature=temperature, stream=True,
+                ),
+                self.timeout,
+            )
+            try:
+                first = await asyncio.wait_for(anext(chunks), self.timeout)
+            except StopAsyncIteration:
+                first = None
+            except BaseException:
+                await _aclose(chunks)
+                raise
+            return chunks, first
+
+        async with self._semaphore:
+            chunks, first = await self._attempts(model, call)
+            try:
+                if first is None:
+                    return
+                yield first
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(anext(chunks), self.stream_timeout)
+                    except StopAsyncIteration:
+                        return
+                    yield chunk
+            finally:
+                await _aclose(chunks)
+
+
+async def _aclose(chunks):
+    close = getattr(chunks, "aclose", None)
+    if close:
+        await close()
+
+
+class _SyncStream:
+    """Blocking iterator over a gateway stream, for TokenStream."""
+
+    def __init__(self, gateway, chunks):
+        self._gateway = gateway
+        self._chunks = chunks
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return self._gateway._run(anext(self._chunks))
+        except StopAsyncIteration:
+            raise StopIteration from None
+
+    def close(self):
+        # Frees the concurrency slot when the consumer stops early
+        self._gateway._run(self._chunks.aclose())
+
+
+def load_gateway(token=None, **options):
+    """Hugging Face first, then the local OpenAI-compatible server if configured."""
+    endpoints = [Endpoint("huggingface", token=token)]
+    local_url = os.getenv(LOCAL_URL_ENV)
+    if local_url:
+        endpoints.append(Endpoint(
+            "local",
+            base_url=local_url,
+            token=os.getenv(LOCAL_KEY_ENV),
+            model=os.getenv(LOCAL_MODEL_ENV, "local-model"),
+        ))
+    options.setdefault("max_concurrency", int(os.getenv(CONCURRENCY_ENV, "8")))
+    return InferenceGateway(endpoints, FALLBACK_MODELS, **options)
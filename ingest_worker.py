@@ -0,0 +1,400 @@
+"""Ingestion service: one embedding model shared by every Streamlit session.
+
+    python ingest_worker.py
+
+Runs PDF extraction, chunking, embedding and LanceDB writes for the
+knowledge base in a separate local process. The app submits uploads and
+polls their progress, and sends query embeddings here too, so no Streamlit
+process loads the model. Embedding requests from all jobs and sessions are
+merged into shared batches. The app starts the service on first use when
+none is running; no external broker is involved.
+
+Requests are pickled, so the service only accepts clients holding its
+authkey: a random key generated per spawn, handed to the service through
+its environment and shared with other local clients through a file only
+the owner can read.
+"""
+import os
+import queue
+import secrets
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+import numpy as np
+
+import metrics
+import startup
+
+
+ADDRESS_ENV = "CURRICUFORGE_INGEST_ADDRESS"
+AUTHKEY_ENV = "CURRICUFORGE_INGEST_AUTHKEY"
+DEFAULT_ADDRESS = "127.0.0.1:50071"
+AUTHKEY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "ingest.key")
+MAX_JOBS = 256
+RPC_METHODS = ("info", "encode", "submit", "status", "remove", "snapshot")
+
+
+def service_address():
+    host, port = os.getenv(ADDRESS_ENV, DEFAULT_ADDRESS).rsplit(":", 1)
+    return host, int(port)
+
+
+def service_authkey():
+    """The configured key, else the one the running service saved; None if neither."""
+    key = os.getenv(AUTHKEY_ENV)
+    if key:
+        return key.encode("utf-8")
+    try:
+        with open(AUTHKEY_PATH, "rb") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def new_authkey():
+    """The configured key, else a fresh random one."""
+    return os.getenv(AUTHKEY_ENV, "").encode("utf-8") or secrets.token_hex(32).encode("ascii")
+
+
+def save_authkey(authkey):
+    os.makedirs(os.path.dirname(AUTHKEY_PATH), exist_ok=True)
+    tmp = f"{AUTHKEY_PATH}.{os.getpid()}"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(authkey)
+    os.replace(tmp, AUTHKEY_PATH)
+
+
+def is_spooled(path):
+    # cleanup=True may only delete the app's spooled uploads
+    spool = os.path.realpath(tempfile.gettempdir())
+    return os.path.commonpath([spool, os.path.realpath(path)]) == spool
+
+
+# ---- Embedding ----
+class EmbeddingBatcher:
+    """Merges concurrent encode() calls into batches of up to `max_batch` texts.
+
+    A call waits at most `max_wait` seconds for others to join its batch, so
+    small query embeddings stay fast while bulk ingestion fills the batches.
+    """
+
+    def __init__(self, model_resource, max_batch=128, max_wait=0.01):
+        self.model_resource = model_resource
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._requests = queue.Queue()
+        threading.Thread(target=self._run, name="embedding-batcher", daemon=True).start()
+
+    def encode(self, texts):
+        future = Future()
+        self._requests.put((list(texts), future))
+        return future.result()
+
+    def _run(self):
+        while True:
+            requests = [self._requests.get()]
+            size = len(requests[0][0])
+            deadline = time.monotonic() + self.max_wait
+            while size < self.max_batch:
+                try:
+                    request = self._requests.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                requests.append(request)
+                size += len(request[0])
+
+            texts = [text for batch, _ in requests for text in batch]
+            metrics.observe("embedding_batch_size", len(texts))
+            try:
+                vectors = np.asarray(self.model_resource.get().encode(texts), dtype=np.float32)
+            except Exception as exc:
+                for _, future in requests:
+                    future.set_exception(exc)
+                continue
+            offset = 0
+            for batch, future in requests:
+                future.set_result(vectors[offset:offset + len(batch)])
+                offset += len(batch)
+
+
+# ---- Service ----
+class Job:
+
+    def __init__(self, path, source, cleanup):
+        self.id = uuid.uuid4().hex
+        self.path = path
+        self.source = source
+        self.cleanup = cleanup
+        self.status = "queued"
+        self.stage = None
+        self.done = 0
+        self.total = 0
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+
+    def as_dict(self):
+        return {
+            "id": self.id,
+            "source": self.source,
+            "status": self.status,
+            "stage": self.stage,
+            "done": self.done,
+            "total": self.total,
+            "result": self.result,
+            "error": self.error,
+            "created": self.created,
+            "finished": self.finished,
+        }
+
+
+class IngestionService:
+    """Job queue, shared model and knowledge base behind the RPC listener."""
+
+    def __init__(self, workers=2, max_batch=128):
+        from embeddings import load_embedder
+
+        self.model_resource = startup.LazyResource("embedding_model", load_embedder)
+        self.model_resource.warm()
+        self.batcher = EmbeddingBatcher(self.model_resource, max_batch)
+        self._knowledge_base = startup.LazyResource("knowledge_base", self._load_knowledge_base)
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self._queue = queue.Queue()
+        for n in range(workers):
+            threading.Thread(target=self._work, name=f"ingest-{n}", daemon=True).start()
+
+    def _load_knowledge_base(self):
+        from chunking import DEFAULT_CONFIG
+        from doc_store import DocumentStore
+        from knowledge_base import KnowledgeBase
+
+        settings = {**DEFAULT_CONFIG.settings(), "model": self.model_resource.get().name}
+        return KnowledgeBase(DocumentStore(), self.batcher.encode, settings)
+
+    # ---- RPC ----
+    def info(self):
+        model = self.model_resource.get()
+        return {"model": model.name, "dimension": model.dimension, "pid": os.getpid()}
+
+    def encode(self, texts):
+        return self.batcher.encode(texts)
+
+    def submit(self, path, source, cleanup=True):
+        job = Job(path, source, cleanup)
+        with self._lock:
+            self._jobs[job.id] = job
+            while len(self._jobs) > MAX_JOBS:
+                self._jobs.popitem(last=False)
+        self._queue.put(job)
+        metrics.inc("ingest_jobs_total", status="queued")
+        return job.id
+
+    def status(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return None if job is None else job.as_dict()
+
+    def remove(self, source):
+        return self._knowledge_base.get().remove(source)
+
+    def snapshot(self):
+        return metrics.REGISTRY.snapshot(sources=False)
+
+    # ---- Workers ----
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            job.status = "running"
+
+            def progress(stage, done, total):
+                job.stage, job.done, job.total = stage, done, total
+
+            try:
+                with metrics.stage("ingest_job"):
+                    job.result = self._knowledge_base.get().add(job.path, job.source, progress)
+                job.status = "done"
+            except Exception as exc:
+                job.status = "error"
+                job.error = f"{type(exc).__name__}: {exc}"
+            finally:
+                job.finished = time.time()
+                metrics.inc("ingest_jobs_total", status=job.status)
+                if job.cleanup and is_spooled(job.path):
+                    try:
+                        os.remove(job.path)
+                    except OSError:
+                        pass
+
+
+def _handle(service, conn):
+    # One client connection: (method, args) requests answered in order
+    with conn:
+        while True:
+            try:
+                method, args = conn.recv()
+            except (EOFError, OSError):
+                return
+            try:
+                if method not in RPC_METHODS:
+                    raise AttributeError(f"unknown ingestion service method {method!r}")
+                reply = ("ok", getattr(service, method)(*args))
+            except Exception as exc:
+                reply = ("error", exc)
+            try:
+                conn.send(reply)
+            except (EOFError, OSError):
+                return
+            except Exception as exc:
+                # The result or exception would not pickle
+                conn.send(("error", RuntimeError(f"{type(exc).__name__}: {exc}")))
+
+
+def serve(address=None, authkey=None, workers=2):
+    authkey = authkey or new_authkey()
+    # Bind before loading anything, so a second instance fails fast and
+    # never overwrites the running service's key
+    listener = Listener(address or service_address(), authkey=authkey)
+    save_authkey(authkey)
+    service = IngestionService(workers)
+    while True:
+        try:
+            conn = listener.accept()
+        except (AuthenticationError, EOFError, OSError):
+            continue
+        threading.Thread(
+            target=_handle, args=(service, conn), name="ingest-rpc", daemon=True
+        ).start()
+
+
+# ---- Client ----
+class IngestionClient:
+    """App-side handle to the service; starts one if none is listening.
+
+    Each thread has its own connection. A dropped one (service crashed or
+    restarted) is replaced, respawning the service if needed, and the call
+    retried once.
+    """
+
+    def __init__(self, address=None, authkey=None, spawn=True, start_timeout=30.0):
+        self.address = address or service_address()
+        self.authkey = authkey
+        self.spawn = spawn
+        self.start_timeout = start_timeout
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _connect(self):
+        authkey = self.authkey or service_authkey()
+        if authkey is None:
+            raise ConnectionRefusedError("no ingestion service key; none has been started")
+        return Client(self.address, authkey=authkey)
+
+    def _spawn(self):
+        # A fresh key per spawn; the service saves it once it has bound.
+        # Another app process may be starting it too; the loser fails to bind and exits
+        authkey = self.authkey or new_authkey()
+        subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__)],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            env={**os.environ, AUTHKEY_ENV: authkey.decode("utf-8")},
+            start_new_session=True,
+        )
+
+    def _open(self, spawn):
+        # Serialised so only one thread starts the service
+        with self._lock:
+            try:
+                return self._connect()
+            except ConnectionRefusedError:
+                if not spawn:
+                    raise
+            self._spawn()
+            deadline = time.monotonic() + self.start_timeout
+            while True:
+                time.sleep(0.2)
+                try:
+                    return self._connect()
+                except (ConnectionRefusedError, AuthenticationError):
+                    # Refused until it binds; a stale key file until it saves its own
+                    if time.monotonic() > deadline:
+                        raise
+
+    def _call(self, method, *args, spawn=None):
+        for attempt in range(2):
+            conn = getattr(self._local, "conn", None)
+            if conn is None:
+                conn = self._local.conn = self._open(self.spawn if spawn is None else spawn)
+            try:
+                conn.send((method, args))
+                status, result = conn.recv()
+            except (EOFError, ConnectionError):
+                # The service went away: drop this connection, then reconnect or respawn once
+                self._local.conn = None
+                conn.close()
+                if attempt:
+                    raise
+                continue
+            if status == "error":
+                raise result
+            return result
+
+    def submit(self, path, source, cleanup=True):
+        return self._call("submit", path, source, cleanup)
+
+    def status(self, job_id):
+        return self._call("status", job_id)
+
+    def wait(self, job_id, poll=0.5, on_progress=None):
+        while True:
+            status = self.status(job_id)
+            if on_progress:
+                on_progress(status)
+            if status is None or status["status"] in ("done", "error"):
+                return status
+            time.sleep(poll)
+
+    def remove(self, source):
+        return self._call("remove", source)
+
+    def encode(self, texts):
+        return self._call("encode", texts)
+
+    def info(self):
+        return self._call("info")
+
+    def snapshot(self):
+        """The service's metrics, or None when it is not running (never starts it)."""
+        try:
+            return self._call("snapshot", spawn=False)
+        except (ConnectionError, AuthenticationError):
+            return None
+
+
+class RemoteEmbedder:
+    """Embedder-compatible encode() backed by the service's shared model."""
+
+    def __init__(self, client):
+        self.client = client
+        info = client.info()
+        self.name = info["model"]
+        self.dimension = info["dimension"]
+
+    def encode(self, texts):
+        single = isinstance(texts, str)
+        vectors = self.client.encode([texts] if single else list(texts))
+        return vectors[0] if single else vectors
+
+
+if __name__ == "__main__":
+    serve()
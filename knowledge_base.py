@@ -0,0 +1,239 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+import metrics
+from chunking import DEFAULT_CONFIG, Deduplicator, chunk_page
+from pdf_extract import file_sha256, iter_pages, page_count
+
+
+MANIFEST_PATH = os.path.join(".cache", "knowledge_base.json")
+EMBED_BATCH = 64
+MAX_CHUNKS_ENV = "CURRICUFORGE_KB_MAX_CHUNKS"
+
+
+def knowledge_doc_id(source):
+    # Keyed by name, not content, so a new version of a file updates in place
+    return hashlib.sha256(f"kb:{source}".encode("utf-8")).hexdigest()
+
+
+def page_hash(chunks):
+    # Hash what gets indexed, so changes in boilerplate or duplicates elsewhere
+    # that alter a page's chunks also count as a change to that page
+    h = hashlib.sha256()
+    for chunk in chunks:
+        h.update(chunk.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class KnowledgeBase:
+    """A persistent, named collection of PDFs in the document store.
+
+    Each source (usually the file name) has its rows in the store's corpus
+    table under one doc_id, and a manifest entry with one hash per page.
+    Re-adding a source re-embeds only the pages whose chunks changed and
+    deletes the rows of pages that are gone; an unchanged file is skipped without being read. Changing the chunking
+    or embedding settings re-ingests a document from scratch. The manifest
+    is re-read when another process (e.g. the ingestion worker) rewrites it.
+
+    The corpus is capped at `max_chunks`: past it, the sources added or
+    re-uploaded least recently are removed.
+    """
+
+    def __init__(self, store, encode, settings, path=MANIFEST_PATH,
+                 chunk_config=DEFAULT_CONFIG, workers=None, max_chunks=None):
+        self.store = store
+        self.encode = encode
+        self.settings = settings
+        self.path = path
+        self.chunk_config = chunk_config
+        self.workers = workers
+        self.max_chunks = max_chunks or int(os.getenv(MAX_CHUNKS_ENV, "200000"))
+        self._lock = threading.Lock()
+        self._source_locks = {}
+        self._mtime = None
+        self._manifest = {}
+        self._refresh()
+
+    # ---- Manifest ----
+    def _refresh(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        with self._lock:
+            if mtime == self._mtime:
+                return
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    self._manifest = json.load(f)
+            except (OSError, ValueError):
+                return
+            self._mtime = mtime
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._manifest, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
+        self._mtime = os.path.getmtime(self.path)
+
+    def documents(self):
+        self._refresh()
+        with self._lock:
+            entries = [dict(entry, pages=len(entry["pages"])) for entry in self._manifest.values()]
+        return sorted(entries, key=lambda entry: entry["source"])
+
+    def sources(self):
+        return [entry["source"] for entry in self.documents()]
+
+    # ---- Updates ----
+    def add(self, path, source=None, progress=None):
+        """Add or update a PDF; returns a summary of what was re-indexed.
+
+        progress(stage, done, total) is called with the number of pages
+        processed as they are extracted and embedded.
+        """
+        progress = progress or (lambda stage, done, total: None)
+        source = source or os.path.basename(path)
+        doc_id = knowledge_doc_id(source)
+        with self._lock:
+            source_lock = self._source_locks.setdefault(doc_id, threading.Lock())
+
+        with source_lock:
+            self._refresh()
+            with self._lock:
+                entry = self._manifest.get(doc_id)
+            content_hash = file_sha256(path)
+            if entry and entry["settings"] != self.settings:
+                self.store.delete_document(doc_id)
+                entry = None
+            if entry and entry["sha256"] == content_hash:
+                metrics.cache("knowledge_base", True)
+                with self._lock:
+                    self._manifest[doc_id]["used"] = time.time()
+                    self._save()
+                return {"doc_id": doc_id, "source": source, "changed_pages": [], "removed_pages": [],
+                        "chunks_embedded": 0}
+            metrics.cache("knowledge_base", False)
+
+            # Pages stream through chunking, hashing and embedding; only the
+            # per-page hashes and one embedding batch are held at a time
+            old = entry["pages"] if entry else {}
+            hashes, changed, pending = {}, [], []
+            chunk_total = embedded = 0
+            total = page_count(path)
+            deduper = Deduplicator(self.chunk_config) if self.chunk_config.dedup else None
+
+            def flush():
+                nonlocal embedded
+                pages = [page for page, _ in pending]
+                chunks, metadata, ids = [], [], []
+                for page, page_chunks in pending:
+                    for i, chunk in enumerate(page_chunks):
+                        chunks.append(chunk)
+                        metadata.append({"page": page, "source": source})
+                        ids.append(f"{doc_id}:{page}:{i}")
+                pending.clear()
+                vectors = [
+                    np.asarray(self.encode(chunks[start:start + EMBED_BATCH]), dtype=np.float32)
+                    for start in range(0, len(chunks), EMBED_BATCH)
+                ]
+                vectors = np.vstack(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+                self.store.replace_pages(doc_id, pages, chunks, vectors, metadata, ids)
+                embedded += len(chunks)
+
+            for n, (page, text) in enumerate(iter_pages(path, workers=self.workers), 1):
+                chunks = chunk_page(text, self.chunk_config, deduper)
+                hashes[str(page)] = page_hash(chunks)
+                chunk_total += len(chunks)
+                if old.get(str(page)) != hashes[str(page)]:
+                    changed.append(page)
+                    pending.append((page, chunks))
+                    if sum(len(c) for _, c in pending) >= EMBED_BATCH:
+                        progress("embed", n, total)
+                        flush()
+                progress("extract", n, total)
+            progress("index", total, total)
+            removed = sorted(int(p) for p in old if p not in hashes)
+            pending.extend((page, []) for page in removed)
+            flush()
+            metrics.inc("knowledge_base_pages_reembedded_total", len(changed))
+
+            now = time.time()
+            with self._lock:
+                self._manifest[doc_id] = {
+                    "doc_id": doc_id,
+                    "source": source,
+                    "sha256": content_hash,
+                    "settings": self.settings,
+                    "pages": hashes,
+                    "chunks": chunk_total,
+                    "added": entry["added"] if entry else now,
+                    "updated": now,
+                    "used": now,
+                }
+                self._save()
+            self._evict(keep=doc_id)
+
+        return {"doc_id": doc_id, "source": source, "changed_pages": changed,
+                "removed_pages": removed, "chunks_embedded": embedded}
+
+    def remove(self, source):
+        doc_id = knowledge_doc_id(source)
+        self.store.delete_document(doc_id)
+        self._refresh()
+        with self._lock:
+            removed = self._manifest.pop(doc_id, None) is not None
+            if removed:
+                self._save()
+        return removed
+
+    def _evict(self, keep):
+        with self._lock:
+            entries = sorted(
+                self._manifest.values(), key=lambda entry: entry.get("used", entry["updated"])
+            )
+            total = sum(entry["chunks"] for entry in entries)
+        for entry in entries:
+            if total <= self.max_chunks:
+                break
+            if entry["doc_id"] == keep:
+                continue
+            with self._lock:
+                source_lock = self._source_locks.setdefault(entry["doc_id"], threading.Lock())
+            # A source being updated right now is not a candidate
+            if not source_lock.acquire(blocking=False):
+                continue
+            try:
+                self.store.delete_document(entry["doc_id"])
+                with self._lock:
+                    self._manifest.pop(entry["doc_id"], None)
+                    self._save()
+            finally:
+                source_lock.release()
+            total -= entry["chunks"]
+            metrics.inc("knowledge_base_evictions_total")
+
+    # ---- Retrieval ----
+    def versions(self, sources=None):
+        """(doc_id, content hash) of each searchable document, sorted; changes on any update."""
+        self._refresh()
+        with self._lock:
+            return tuple(sorted(
+                (doc_id, entry["sha256"]) for doc_id, entry in self._manifest.items()
+                if entry["chunks"] and (sources is None or entry["source"] in sources)
+            ))
+
+    def search(self, query_text, query_vector, k=5, sources=None, where=None):
+        """Hybrid search over the whole corpus, or only the named sources."""
+        doc_ids = [doc_id for doc_id, _ in self.versions(sources)]
+        if not doc_ids:
+            return []
+        return self.store.hybrid_search(doc_ids, query_text, query_vector, k=k, where=where)
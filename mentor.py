@@ -0,0 +1,141 @@
+import re
+
+import numpy as np
+
+from chunking import estimate_tokens, trim_to_tokens
+from curriculum_parser import SECTION_TITLES
+
+
+MENTOR_TOKEN_BUDGET = 1200
+MENTOR_SECTION_TOKENS = 250
+WEEK_MENTION_RE = re.compile(r"\bweeks?\s+(\d+)(?:\s*(?:-|–|to|and)\s*(\d+))?", re.IGNORECASE)
+
+
+def _text_sections(text, size):
+    # Consecutive lines grouped into sections of about `size` tokens
+    sections = []
+    lines = []
+    used = 0
+    for line in filter(None, (line.strip() for line in text.splitlines())):
+        tokens = estimate_tokens(line)
+        if lines and used + tokens > size:
+            sections.append("\n".join(lines))
+            lines, used = [], 0
+        lines.append(trim_to_tokens(line, size))
+        used += min(tokens, size)
+    if lines:
+        sections.append("\n".join(lines))
+    return sections
+
+
+class MentorIndex:
+    """Week-level index over a parsed curriculum for mentor retrieval.
+
+    An output with no parsable weeks is indexed as sections of its raw text
+    instead, so the mentor still sees the curriculum.
+    """
+
+    def __init__(self, curriculum, encode, section_tokens=MENTOR_SECTION_TOKENS):
+        self.curriculum = curriculum
+        self.encode = encode
+        self.sections = []
+        if curriculum.weeks:
+            for week in curriculum.weeks:
+                self.sections.append((set(week.numbers), week.to_markdown()))
+            parts = [("Course Overview", curriculum.overview)]
+            parts += [(title, [f"- {i}" for i in getattr(curriculum, name)])
+                      for name, title in SECTION_TITLES.items()]
+            parts.append(("Additional Notes", curriculum.other))
+            for title, lines in parts:
+                if lines:
+                    self.sections.append((set(), f"{title}:\n" + "\n".join(lines)))
+        else:
+            text = curriculum.raw or "\n".join(curriculum.overview + curriculum.other)
+            self.sections = [(set(), section) for section in _text_sections(text, section_tokens)]
+
+        if self.sections:
+            vectors = np.asarray(encode([text for _, text in self.sections]), dtype=np.float32)
+            self.vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        else:
+            self.vectors = np.zeros((0, 0), dtype=np.float32)
+
+    def retrieve(self, question, budget):
+        """Most relevant sections in curriculum order, within `budget` tokens.
+
+        Weeks named in the question ("week 3", "weeks 5-7") always go first.
+        """
+        if not self.sections:
+            return []
+
+        mentioned = set()
+        for match in WEEK_MENTION_RE.finditer(question):
+            start = int(match.group(1))
+            end = int(match.group(2) or start)
+            mentioned.update(range(start, min(end, start + 8) + 1))
+
+        vector = np.asarray(self.encode([question]), dtype=np.float32)[0]
+        vector /= np.linalg.norm(vector) or 1.0
+        scores = self.vectors @ vector
+        order = sorted(
+            range(len(self.sections)),
+            key=lambda i: (not self.sections[i][0] & mentioned, -scores[i]),
+        )
+
+        chosen = []
+        used = 0
+        for i in order:
+            tokens = estimate_tokens(self.sections[i][1])
+            if used + tokens > budget:
+                continue
+            chosen.append(i)
+            used += tokens
+        return [self.sections[i][1] for i in sorted(chosen)]
+
+
+class MentorSession:
+    """Bounded-context mentor conversation.
+
+    Each request carries the course header, the last `recent_turns` turns
+    verbatim, a rolling extractive summary of older turns and as many
+    retrieved curriculum sections as fit in `token_budget`.
+    """
+
+    def __init__(self, index, token_budget=MENTOR_TOKEN_BUDGET, summary_budget=200, recent_turns=2):
+        self.index = index
+        self.token_budget = token_budget
+        self.summary_budget = summary_budget
+        self.recent_turns = recent_turns
+        self.turns = []
+        self.summary = []
+
+    def header(self):
+        c = self.index.curriculum
+        parts = [p for p in (c.course_name, c.level, c.duration) if p]
+        return "Course: " + " · ".join(parts) if parts else ""
+
+    def history(self):
+        lines = []
+        if self.summary:
+            lines.append("Earlier: " + " ".join(self.summary))
+        for question, answer in self.turns:
+            lines.append(f"Student: {question}")
+            lines.append(f"Mentor: {trim_to_tokens(answer, 120)}")
+        return "\n".join(lines)
+
+    def context(self, question):
+        history = self.history()
+        reserved = (
+            estimate_tokens(self.header()) + estimate_tokens(history)
+            + estimate_tokens(question) + 60
+        )
+        sections = self.index.retrieve(question, max(0, self.token_budget - reserved))
+        return "\n\n".join([self.header(), *sections]).strip(), history
+
+    def record(self, question, answer):
+        self.turns.append((question, answer))
+        while len(self.turns) > self.recent_turns:
+            old_question, old_answer = self.turns.pop(0)
+            first_sentence = re.split(r"(?<=[.!?])\s", old_answer.strip(), maxsplit=1)[0]
+            self.summary.append(f"Q: {old_question} A: {trim_to_tokens(first_sentence, 40)}")
+            while self.summary and estimate_tokens(" ".join(self.summary)) > self.summary_budget:
+                self.summary.pop(0)
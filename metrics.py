@@ -0,0 +1,189 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+METRICS_PORT_ENV = "CURRICUFORGE_METRICS_PORT"
+
+
+class Histogram:
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th observation
+        if not self.count:
+            return None
+        target = q * self.count
+        for bound, count in zip(self.buckets, self.counts):
+            if count >= target:
+                return bound
+        return float("inf")
+
+
+def _labels_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+class Metrics:
+    """In-process counters and latency histograms, keyed by name + labels."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._sources = []
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _labels_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, _labels_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def stage(self, name, **labels):
+        """Time a pipeline stage into stage_seconds; count failures in stage_errors_total."""
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.inc("stage_errors_total", stage=name, **labels)
+            raise
+        finally:
+            self.observe("stage_seconds", time.perf_counter() - started, stage=name, **labels)
+
+    def cache(self, name, hit):
+        self.inc("cache_requests_total", cache=name, result="hit" if hit else "miss")
+
+    def add_source(self, fetch, **labels):
+        """Merge another process's snapshot() into every export.
+
+        `fetch` returns a snapshot dict, or None when that process is not
+        running; its series are tagged with `labels`.
+        """
+        self._sources.append((fetch, labels))
+
+    # ---- Export ----
+    def snapshot(self, sources=True):
+        with self._lock:
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self._counters.items())
+            ]
+            histograms = [
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": h.count,
+                    "sum": round(h.sum, 6),
+                    "p50": h.quantile(0.5),
+                    "p95": h.quantile(0.95),
+                    "buckets": list(zip(h.buckets, h.counts)),
+                }
+                for (name, labels), h in sorted(self._histograms.items())
+            ]
+        if sources:
+            for fetch, extra in list(self._sources):
+                try:
+                    remote = fetch()
+                except Exception:
+                    remote = None
+                if not remote:
+                    continue
+                for kind, entries in (("counters", counters), ("histograms", histograms)):
+                    entries.extend(
+                        {**entry, "labels": {**entry["labels"], **extra}} for entry in remote[kind]
+                    )
+        return {"counters": counters, "histograms": histograms}
+
+    def to_json_lines(self):
+        now = time.time()
+        snapshot = self.snapshot()
+        lines = [
+            json.dumps({"ts": now, "type": "counter", **c}) for c in snapshot["counters"]
+        ] + [
+            json.dumps({"ts": now, "type": "histogram", **h}) for h in snapshot["histograms"]
+        ]
+        return "\n".join(lines) + "\n"
+
+    def to_prometheus(self, prefix="curricuforge_"):
+        lines = []
+        snapshot = self.snapshot()
+        for c in snapshot["counters"]:
+            labels = _labels_key(c["labels"])
+            lines.append(f"{prefix}{c['name']}{_format_labels(labels)} {c['value']}")
+        for h in snapshot["histograms"]:
+            name, labels = h["name"], _labels_key(h["labels"])
+            for bound, count in h["buckets"]:
+                lines.append(
+                    f"{prefix}{name}_bucket{_format_labels(labels, [('le', bound)])} {count}"
+                )
+            lines.append(f"{prefix}{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {h['count']}")
+            lines.append(f"{prefix}{name}_sum{_format_labels(labels)} {h['sum']}")
+            lines.append(f"{prefix}{name}_count{_format_labels(labels)} {h['count']}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Metrics()
+
+inc = REGISTRY.inc
+observe = REGISTRY.observe
+stage = REGISTRY.stage
+cache = REGISTRY.cache
+
+
+# ---- Endpoint ----
+class _Handler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            body, content_type = REGISTRY.to_prometheus(), "text/plain; version=0.0.4"
+        elif self.path == "/metrics.jsonl":
+            body, content_type = REGISTRY.to_json_lines(), "application/x-ndjson"
+        else:
+            self.send_error(404)
+            return
+        data = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port, host="127.0.0.1"):
+    """Serve /metrics (Prometheus text) and /metrics.jsonl from a daemon thread."""
+    server = ThreadingHTTPServer((host, port), _Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
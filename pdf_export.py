@@ -0,0 +1,167 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from io import BytesIO
+from xml.sax.saxutils import escape
+
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer
+
+import metrics
+from curriculum_parser import SECTION_TITLES, strip_markdown
+
+
+# ---- Styles and spacer (built once) ----
+STYLES = getSampleStyleSheet()
+NORMAL = STYLES["Normal"]
+HEADING = STYLES["Heading1"]
+SECTION = STYLES["Heading2"]
+WEEK = STYLES["Heading3"]
+
+GAP = Spacer(1, 0.2 * inch)
+
+
+def content_key(curriculum):
+    return hashlib.sha256(repr(curriculum).encode("utf-8")).hexdigest()
+
+
+def _labelled(pairs):
+    # One paragraph per block with line breaks instead of one per line
+    return "<br/>".join(f"<b>{label}:</b> {escape(value)}" for label, value in pairs if value)
+
+
+class PdfExporter:
+    """Renders curricula to PDF bytes, memoized by content hash.
+
+    Week markup is cached by the week's own content, so a repaired or edited
+    curriculum only re-escapes the weeks that changed. Paragraph objects are
+    not reused: ReportLab mutates them when splitting across pages. Renders
+    run on a small thread pool; concurrent requests for the same content
+    share one render.
+    """
+
+    def __init__(self, max_documents=32, max_weeks=2048, workers=2):
+        self.max_documents = max_documents
+        self.max_weeks = max_weeks
+        self._documents = OrderedDict()
+        self._weeks = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pdf-export")
+
+    # ---- Public API ----
+    def submit(self, curriculum):
+        key = content_key(curriculum)
+        with self._lock:
+            data = self._documents.get(key)
+            metrics.cache("pdf", data is not None)
+            if data is not None:
+                self._documents.move_to_end(key)
+                future = Future()
+                future.set_result(data)
+                return future
+            future = self._pending.get(key)
+            if future is None:
+                future = self._pool.submit(self._render_cached, key, curriculum)
+                self._pending[key] = future
+        return future
+
+    def export(self, curriculum):
+        return self.submit(curriculum).result()
+
+    def export_many(self, curricula):
+        futures = [self.submit(curriculum) for curriculum in curricula]
+        return [future.result() for future in futures]
+
+    # ---- Caching ----
+    def _render_cached(self, key, curriculum):
+        try:
+            with self._lock:
+                data = self._documents.get(key)
+                if data is not None:
+                    self._documents.move_to_end(key)
+                    return data
+            data = self.render(curriculum)
+            with self._lock:
+                self._documents[key] = data
+                while len(self._documents) > self.max_documents:
+                    self._documents.popitem(last=False)
+            return data
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def _week_markup(self, week):
+        key = repr(week)
+        with self._lock:
+            markup = self._weeks.get(key)
+            if markup is not None:
+                self._weeks.move_to_end(key)
+                return markup
+
+        title = f"{week.label}: {week.title}" if week.title else week.label
+        body = _labelled((
+            ("Topic", week.topic),
+            ("Key Concepts", week.key_concepts),
+            ("Practical / Activity", week.practical),
+        ))
+        notes = "<br/>".join(escape(note) for note in week.notes)
+        markup = (escape(title), "<br/>".join(part for part in (body, notes) if part))
+
+        with self._lock:
+            self._weeks[key] = markup
+            while len(self._weeks) > self.max_weeks:
+                self._weeks.popitem(last=False)
+        return markup
+
+    # ---- Rendering ----
+    def render(self, curriculum):
+        with metrics.stage("pdf_render"):
+            buffer = BytesIO()
+            doc = SimpleDocTemplate(buffer, pagesize=A4)
+            doc.build(self._flowables(curriculum))
+            return buffer.getvalue()
+
+    def _flowables(self, curriculum):
+        if not curriculum.weeks:
+            # Unstructured output: paragraphs split on blank lines
+            blocks = strip_markdown(curriculum.raw).split("\n\n")
+            elements = []
+            for block in blocks:
+                lines = [escape(line.strip()) for line in block.splitlines() if line.strip()]
+                if lines:
+                    elements += [Paragraph("<br/>".join(lines), NORMAL), GAP]
+            return elements
+
+        elements = []
+        if curriculum.course_name:
+            elements.append(Paragraph(escape(curriculum.course_name), HEADING))
+        header = _labelled((("Level", curriculum.level), ("Duration", curriculum.duration)))
+        if header:
+            elements.append(Paragraph(header, NORMAL))
+        elements.append(GAP)
+
+        if curriculum.overview:
+            elements.append(Paragraph("Course Overview", SECTION))
+            elements.append(Paragraph("<br/>".join(escape(l) for l in curriculum.overview), NORMAL))
+
+        elements.append(Paragraph("Weekly Plan", SECTION))
+        for week in curriculum.weeks:
+            title, body = self._week_markup(week)
+            elements.append(Paragraph(title, WEEK))
+            if body:
+                elements.append(Paragraph(body, NORMAL))
+
+        for name, title in SECTION_TITLES.items():
+            items = getattr(curriculum, name)
+            if items:
+                elements.append(Paragraph(title, SECTION))
+                elements.append(Paragraph("<br/>".join(f"• {escape(i)}" for i in items), NORMAL))
+
+        if curriculum.other:
+            elements.append(Paragraph("Additional Notes", SECTION))
+            elements.append(Paragraph("<br/>".join(escape(l) for l in curriculum.other), NORMAL))
+        return elements
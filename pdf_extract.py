@@ -0,0 +1,75 @@
+import hashlib
+import multiprocessing
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import fitz  # PyMuPDF
+
+
+PAGES_PER_TASK = 16
+
+
+def spool_upload(fileobj, suffix=".pdf"):
+    # Copy an upload to disk in blocks so workers can open it by path
+    fileobj.seek(0)
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
+        shutil.copyfileobj(fileobj, tmp, 1024 * 1024)
+    return tmp.name
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def page_count(path):
+    with fitz.open(path) as doc:
+        return doc.page_count
+
+
+def _extract_range(path, start, stop):
+    with fitz.open(path) as doc:
+        return [(i + 1, doc[i].get_text()) for i in range(start, stop)]
+
+
+def iter_pages(path, workers=None, pages_per_task=PAGES_PER_TASK):
+    """Yield (page_number, text) in page order, one page at a time.
+
+    Large documents are split into page ranges spread over a process pool.
+    Only a bounded window of ranges is in flight, so memory does not grow
+    with the number of pages.
+    """
+    total = page_count(path)
+    if workers is None:
+        workers = min(os.cpu_count() or 1, total // pages_per_task)
+
+    if workers <= 1:
+        with fitz.open(path) as doc:
+            for i, page in enumerate(doc):
+                yield i + 1, page.get_text()
+        return
+
+    ranges = [
+        (start, min(start + pages_per_task, total))
+        for start in range(0, total, pages_per_task)
+    ]
+    window = workers * 2
+
+    # Never fork: the parent may be the threaded Streamlit server or the
+    # ingestion service with an embedding model and batcher threads loaded
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    context = multiprocessing.get_context(method)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        pending = [pool.submit(_extract_range, path, *r) for r in ranges[:window]]
+        next_range = window
+        while pending:
+            for page in pending.pop(0).result():
+                yield page
+            if next_range < len(ranges):
+                pending.append(pool.submit(_extract_range, path, *ranges[next_range]))
+                next_range += 1
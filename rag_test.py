@@ -1,108 +1,47 @@
-import fitz  # PyMuPDF
-import lancedb
-from sentence_transformers import SentenceTransformer
-
-def extract_text(pdf_path):
-    text = ""
-    with fitz.open(pdf_path) as doc:
-        for page in doc:
-            text += page.get_text()
-    return text
-
-
-def chunk_text(text, chunk_size=500):
-    chunks = []
-    for i in range(0, len(text), chunk_size):
-        chunks.append(text[i:i+chunk_size])
-    return chunks
+import os
 
+from chunking import DEFAULT_CONFIG
+from doc_store import DocumentStore
+from embeddings import load_embedder
+from knowledge_base import KnowledgeBase
 
 # ---- TEST ----
 
 pdf_path = "sample_curriculum.pdf"
-text = extract_text(pdf_path)
-
-chunks = chunk_text(text)
+# A scratch knowledge base, so the test never writes into the app's corpus
+test_dir = os.path.join(".cache", "rag_test")
 
-print(f"Total Chunks Created: {len(chunks)}\n")
 print("Loading embedding model...")
-model = SentenceTransformer("all-MiniLM-L6-v2")
+model = load_embedder()
 
-print("Creating embeddings...")
-chunk_embeddings = model.encode(chunks)
-
-print("Embedding shape:", chunk_embeddings.shape)
-print("First Chunk:\n")
-print(chunks[0])
-print("Connecting to LanceDB and storing chunks")
-db = lancedb.connect("lancedb")
-
-print("Creating table...")
-table = db.create_table(
-    "curriculum",
-    data=[
-        {"text": chunks[i], "vector": chunk_embeddings[i]}
-        for i in range(len(chunks))
-    ],
-    mode="overwrite"
+print("Connecting to LanceDB")
+store = DocumentStore(os.path.join(test_dir, "lancedb"))
+knowledge_base = KnowledgeBase(
+    store, model.encode, {**DEFAULT_CONFIG.settings(), "model": model.name},
+    path=os.path.join(test_dir, "knowledge_base.json"),
 )
 
-print("Chunks stored in LanceDB.")
-print("\nPerforming retrieval...")
-
-query = "Generate a structured 4-week course plan"
-query_embedding = model.encode([query])[0]
-
-results = table.search(query_embedding).limit(3).to_list()
-
-print("\nTop Retrieved Chunks:\n")
-
-for i, result in enumerate(results):
-    print(f"--- Chunk {i+1} ---")
-    print(result["text"])
-    print("\n")
-print("\nPerforming retrieval...")
-
-query = "Generate a structured 4-week course plan"
-query_embedding = model.encode([query])[0]
-
-results = table.search(query_embedding).limit(3).to_list()
-
-print("\nTop Retrieved Chunks:\n")
-
-for i, result in enumerate(results):
-    print(f"--- Chunk {i+1} ---")
-    print(result["text"])
-    print("\n")
-print("\nPerforming retrieval...")
-
-query = "Generate a structured 4-week course plan"
-query_embedding = model.encode([query])[0]
-
-results = table.search(query_embedding).limit(3).to_list()
-
-print("\nTop Retrieved Chunks:\n")
+print("Adding document to the knowledge base...")
+result = knowledge_base.add(pdf_path)
+print(f"Pages indexed: {len(result['changed_pages'])}, chunks embedded: {result['chunks_embedded']}")
+print("Documents:", knowledge_base.documents())
 
-for i, result in enumerate(results):
-    print(f"--- Chunk {i+1} ---")
-    print(result["text"])
-    print("\n")
 print("\nPerforming retrieval...")
 
 query = "Generate a structured 4-week course plan"
 query_embedding = model.encode([query])[0]
 
-results = table.search(query_embedding).limit(3).to_list()
+results = knowledge_base.search(query, query_embedding, k=3, sources=[result["source"]])
 
 print("\nTop Retrieved Chunks:\n")
 
-for i, result in enumerate(results):
-    print(f"--- Chunk {i+1} ---")
-    print(result["text"])
+for i, hit in enumerate(results):
+    print(f"--- Chunk {i+1} (page {hit['page']}) ---")
+    print(hit["text"])
     print("\n")
 
-retrieved_texts = [result["text"] for result in results]
+retrieved_texts = [hit["text"] for hit in results]
 context = "\n\n".join(retrieved_texts)
 
 print("\n--- Context Being Sent to LLM ---\n")
-print(context[:1000])
\ No newline at end of file
+print(context[:1000])
@@ -0,0 +1,202 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+import metrics
+
+
+CACHE_PATH = os.path.join(".cache", "responses.sqlite")
+WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_prompt(prompt):
+    return WHITESPACE_RE.sub(" ", prompt).strip().casefold()
+
+
+def exact_key(model, prompt, **params):
+    payload = json.dumps(
+        {"model": model, "prompt": normalize_prompt(prompt), "params": params}, sort_keys=True
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class _Flight:
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.text = None
+        self.error = None
+        self.cancelled = False
+
+
+class ResponseCache:
+    """Exact + semantic cache for LLM generations, persisted in SQLite.
+
+    The exact tier is keyed by the normalised prompt and model parameters.
+    The semantic tier reuses a stored response whose embedded topic is at
+    least `semantic_threshold` cosine-similar and whose other selectors
+    match exactly. Entries expire after `ttl` seconds and the least recently
+    used are evicted beyond `max_entries`. Identical requests in flight at
+    the same time share one upstream call.
+    """
+
+    def __init__(self, path=CACHE_PATH, ttl=7 * 24 * 3600, max_entries=5000,
+                 embed=None, semantic_threshold=0.92):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.embed = embed
+        self.semantic_threshold = semantic_threshold
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, selectors TEXT, vector BLOB, text TEXT, "
+            "created REAL, accessed REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_selectors ON responses (selectors)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+
+    # ---- Lookup ----
+    def get(self, key, topic=None, selectors=None):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT key, text, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row and now - row[2] <= self.ttl:
+                self._touch(row[0], now)
+                return row[1]
+
+        if topic is None or self.embed is None:
+            return None
+        return self._semantic_get(topic, selectors, now)
+
+    def _semantic_get(self, topic, selectors, now):
+        vector = self._topic_vector(topic)
+        if vector is None:
+            return None
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, vector, text FROM responses "
+                "WHERE selectors = ? AND vector IS NOT NULL AND created >= ?",
+                (_selectors_key(selectors), now - self.ttl),
+            ).fetchall()
+            best = None
+            best_score = self.semantic_threshold
+            for key, blob, text in rows:
+                score = float(np.dot(vector, np.frombuffer(blob, dtype=np.float32)))
+                if score >= best_score:
+                    best, best_score = (key, text), score
+            if best:
+                self._touch(best[0], now)
+                return best[1]
+        return None
+
+    def _topic_vector(self, topic):
+        # `embed` may return None when no model is available yet
+        vector = self.embed(normalize_prompt(topic))
+        if vector is None:
+            return None
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def _touch(self, key, now):
+        with self._conn:
+            self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+
+    # ---- Store ----
+    def put(self, key, text, topic=None, selectors=None):
+        now = time.time()
+        vector = None
+        if topic is not None and self.embed is not None:
+            vector = self._topic_vector(topic)
+            vector = None if vector is None else vector.tobytes()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, _selectors_key(selectors), vector, text, now, now),
+            )
+            self._conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+            self._conn.execute(
+                "DELETE FROM responses WHERE key IN ("
+                "SELECT key FROM responses ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    # ---- Coalescing ----
+    def join(self, key):
+        """Return (flight, is_leader); only the leader calls upstream."""
+        with self._lock:
+            flight = self._inflight.get(key)
+            if flight is not None:
+                return flight, False
+            flight = _Flight()
+            self._inflight[key] = flight
+            return flight, True
+
+    def resolve(self, key, flight, text=None, error=None, cancelled=False):
+        flight.text = text
+        flight.error = error
+        flight.cancelled = cancelled
+        with self._lock:
+            self._inflight.pop(key, None)
+        flight.done.set()
+
+
+def _selectors_key(selectors):
+    return json.dumps(selectors or {}, sort_keys=True)
+
+
+def cached_stream(cache, stream, topic=None, selectors=None):
+    """Yield the text of a TokenStream through the response cache.
+
+    Hits and coalesced followers yield the whole stored text at once; the
+    leader streams tokens live and stores the result when it completes. If
+    the leader is cancelled (its user left or changed inputs), a waiting
+    follower takes over as leader instead of inheriting the cancellation.
+    """
+    key = exact_key(stream.model, stream.prompt, max_tokens=stream.max_tokens,
+                    temperature=stream.temperature)
+    text = cache.get(key, topic, selectors)
+    metrics.cache("response", text is not None)
+    if text is not None:
+        yield text
+        return
+
+    while True:
+        flight, leader = cache.join(key)
+        if leader:
+            break
+        metrics.inc("coalesced_requests_total")
+        flight.done.wait()
+        if flight.text is not None:
+            yield flight.text
+            return
+        if not flight.cancelled:
+            raise flight.error or RuntimeError("coalesced generation failed")
+
+    try:
+        yield from stream
+    except Exception as exc:
+        cache.resolve(key, flight, error=exc, cancelled=stream.stats.cancelled)
+        raise
+    except BaseException:
+        # GeneratorExit from a Streamlit rerun closing the leader, or an
+        # interrupt: the generation was abandoned, so a follower takes over
+        cache.resolve(key, flight, cancelled=True)
+        raise
+    if stream.stats.cancelled:
+        cache.resolve(key, flight, cancelled=True)
+        return
+    text = stream.text
+    cache.put(key, text, topic, selectors)
+    cache.resolve(key, flight, text=text)
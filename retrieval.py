@@ -0,0 +1,101 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import metrics
+from doc_store import RRF_K
+
+
+# One query per part of the plan the RAG prompt asks for
+RAG_QUERIES = {
+    "overview": "Course overview, aims and prerequisites of a {duration}-week academic curriculum",
+    "weekly": "Weekly topics, key concepts and practical activities",
+    "assessment": "Assessment strategy, learning outcomes and evaluation criteria",
+}
+
+
+def rag_queries(duration):
+    return [template.format(duration=duration) for template in RAG_QUERIES.values()]
+
+
+def fuse(result_lists, k):
+    """Merge ranked hit lists with reciprocal rank fusion, one entry per chunk."""
+    fused = {}
+    for hits in result_lists:
+        for rank, hit in enumerate(hits):
+            entry = fused.setdefault(hit["id"], [0.0, hit])
+            entry[0] += 1.0 / (RRF_K + rank + 1)
+    ranked = sorted(fused.values(), key=lambda entry: entry[0], reverse=True)
+    return [hit for _, hit in ranked[:k]]
+
+
+class Retriever:
+    """Memoised query embeddings and search results over a KnowledgeBase.
+
+    Query vectors are kept in memory by text, and the queries missing from a
+    call are encoded in one batch. Results are cached per (documents and
+    their versions, query, k, filter), so re-adding a changed document makes
+    its old entries unreachable; they age out of the LRU.
+    """
+
+    def __init__(self, knowledge_base, encode, max_queries=256, max_results=512):
+        self.knowledge_base = knowledge_base
+        self.encode = encode
+        self.max_queries = max_queries
+        self.max_results = max_results
+        self._lock = threading.Lock()
+        self._vectors = OrderedDict()
+        self._results = OrderedDict()
+
+    def embed(self, queries):
+        with self._lock:
+            found = {q: self._vectors[q] for q in queries if q in self._vectors}
+            for query in found:
+                self._vectors.move_to_end(query)
+        missing = [q for q in dict.fromkeys(queries) if q not in found]
+        metrics.inc("cache_requests_total", len(found), cache="query_vector", result="hit")
+        metrics.inc("cache_requests_total", len(missing), cache="query_vector", result="miss")
+
+        if missing:
+            found.update(zip(missing, np.asarray(self.encode(missing), dtype=np.float32)))
+            with self._lock:
+                self._vectors.update((q, found[q]) for q in missing)
+                while len(self._vectors) > self.max_queries:
+                    self._vectors.popitem(last=False)
+        return [found[q] for q in queries]
+
+    def retrieve_many(self, queries, k=5, sources=None, where=None):
+        """Ranked hits for each query, searching only for the uncached ones."""
+        versions = self.knowledge_base.versions(sources)
+        if not versions:
+            return [[] for _ in queries]
+
+        keys = [(versions, query, k, where) for query in queries]
+        results = {}
+        with self._lock:
+            for key in keys:
+                if key in self._results:
+                    self._results.move_to_end(key)
+                    results[key] = self._results[key]
+        metrics.inc("cache_requests_total", len(results), cache="retrieval", result="hit")
+
+        pending = [key for key in dict.fromkeys(keys) if key not in results]
+        metrics.inc("cache_requests_total", len(pending), cache="retrieval", result="miss")
+        if pending:
+            texts = [key[1] for key in pending]
+            # Vectors stay on the hits for MMR in the context builder
+            hits = self.knowledge_base.store.hybrid_search_many(
+                [doc_id for doc_id, _ in versions], texts, self.embed(texts), k, where,
+                keep_vectors=True,
+            )
+            results.update(zip(pending, hits))
+            with self._lock:
+                self._results.update(zip(pending, hits))
+                while len(self._results) > self.max_results:
+                    self._results.popitem(last=False)
+        return [results[key] for key in keys]
+
+    def retrieve(self, queries, k=5, sources=None, where=None):
+        """Fused top-k over all queries, e.g. rag_queries(duration)."""
+        return fuse(self.retrieve_many(queries, k, sources, where), k)
@@ -0,0 +1,108 @@
+import importlib
+import json
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+
+PROCESS_START = time.perf_counter()
+
+# Modules the app only needs for RAG, PDF export or embeddings
+HEAVY_MODULES = ["fitz", "lancedb", "reportlab.platypus", "sentence_transformers", "torch"]
+
+_lock = threading.Lock()
+_timings = {}
+_marks = {}
+
+
+@contextmanager
+def timed(name):
+    """Record how long the first run of a named step took (later runs are cached hits)."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        with _lock:
+            _timings.setdefault(name, time.perf_counter() - started)
+
+
+def mark(name):
+    """Record seconds since process start the first time `name` happens."""
+    with _lock:
+        _marks.setdefault(name, time.perf_counter() - PROCESS_START)
+
+
+def record(name, seconds):
+    with _lock:
+        _timings.setdefault(name, seconds)
+
+
+def report():
+    with _lock:
+        return {
+            "timings_s": {k: round(v, 4) for k, v in _timings.items()},
+            "since_start_s": {k: round(v, 4) for k, v in _marks.items()},
+        }
+
+
+class LazyResource:
+    """Builds an expensive object on first use, or ahead of time via warm()."""
+
+    def __init__(self, name, factory):
+        self.name = name
+        self.factory = factory
+        self._value = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def ready(self):
+        return self._value is not None
+
+    def get(self):
+        if self._value is None:
+            with self._lock:
+                if self._value is None:
+                    with timed(self.name):
+                        self._value = self.factory()
+        return self._value
+
+    def get_if_ready(self):
+        return self._value
+
+    def warm(self):
+        with self._lock:
+            if self._thread is None and self._value is None:
+                self._thread = threading.Thread(
+                    target=self.get, name=f"warm-{self.name}", daemon=True
+                )
+                self._thread.start()
+
+
+def measure_imports(modules=HEAVY_MODULES):
+    """Cold import time of each module, each in a fresh interpreter."""
+    results = {}
+    for name in modules:
+        code = (
+            "import time; t = time.perf_counter(); import importlib; "
+            f"importlib.import_module({name!r}); print(time.perf_counter() - t)"
+        )
+        proc = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+        # Some imports print warnings to stdout (PyMuPDF); the timing is the last line
+        lines = proc.stdout.strip().splitlines()
+        results[name] = round(float(lines[-1]), 4) if proc.returncode == 0 and lines else None
+    return results
+
+
+def import_app_modules():
+    # Everything app_streamlit imports eagerly, i.e. the Topic-Based cold path
+    for name in ("streamlit", "inference", "generation", "curriculum_parser", "response_cache"):
+        with timed(f"import:{name}"):
+            importlib.import_module(name)
+
+
+if __name__ == "__main__":
+    import_app_modules()
+    print(json.dumps({"cold_imports_s": measure_imports(), **report()}, indent=2))
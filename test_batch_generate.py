@@ -0,0 +1,63 @@
+import json
+
+from batch_generate import RagPipeline, completed_ids, read_items, run_batch
+from benchmark import FakeInferenceClient
+
+
+class FailingTopicClient(FakeInferenceClient):
+
+    def __init__(self, topic):
+        super().__init__(latency=0, tokens_per_second=0)
+        self.topic = topic
+
+    def chat_completion(self, model, messages, **kwargs):
+        if self.topic in messages[-1]["content"]:
+            raise RuntimeError("upstream down")
+        return super().chat_completion(model, messages, **kwargs)
+
+
+def write_topics(path, topics):
+    with open(path, "w", encoding="utf-8") as f:
+        for topic in topics:
+            f.write(json.dumps({"topic": topic, "duration": 2}) + "\n")
+
+
+def test_rerun_only_redoes_failed_items(tmp_path):
+    topics = tmp_path / "topics.jsonl"
+    out = str(tmp_path / "catalog.jsonl")
+    write_topics(topics, ["Statistics", "Databases", "Networks"])
+    items = read_items(str(topics))
+
+    failures = run_batch(items, FailingTopicClient("Networks"), out, workers=2, item_retries=0,
+                         log=lambda message: None)
+    assert failures == 1
+    assert len(completed_ids(out)) == 2
+
+    client = FakeInferenceClient(latency=0, tokens_per_second=0)
+    messages = []
+    assert run_batch(items, client, out, workers=2, log=messages.append) == 0
+    assert messages[0] == "3 items, 2 already done, 1 to run"
+    assert completed_ids(out) == {item["id"] for item in items}
+    with open(out, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f]
+    assert [r["topic"] for r in records if r["status"] == "ok"][-1] == "Networks"
+
+
+def test_batch_sources_are_namespaced_by_relative_path(tmp_path):
+    submitted = []
+
+    class Ingestion:
+        def submit(self, path, source, cleanup=True):
+            submitted.append(source)
+            return source
+
+        def wait(self, job_id):
+            return {"status": "done"}
+
+    rag = RagPipeline(str(tmp_path))
+    rag._ready = True
+    rag.ingestion = Ingestion()
+    assert rag.add(str(tmp_path / "a" / "syllabus.pdf")) == "batch:a/syllabus.pdf"
+    assert rag.add(str(tmp_path / "b" / "syllabus.pdf")) == "batch:b/syllabus.pdf"
+    rag.add(str(tmp_path / "a" / "syllabus.pdf"))
+    assert submitted == ["batch:a/syllabus.pdf", "batch:b/syllabus.pdf"]
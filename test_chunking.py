@@ -0,0 +1,71 @@
+from chunking import ChunkConfig, Deduplicator, chunk_pages
+
+
+def course_page(p, header=True):
+    lines = [
+        f"Week {p}: Topic number {p}",
+        f"Students will understand concept alpha{p} and apply it to case study {p}.",
+        "Assessment:",
+        f"Quiz on alpha{p} worth 10% of the final grade.",
+        "Reading: Chapter 3",
+    ]
+    if header:
+        lines = ["Intro to Data Science - Spring Term"] + lines + [f"Page {p} of 6"]
+    return "\n".join(lines)
+
+
+def test_strip_boilerplate_removes_running_header_and_footer():
+    deduper = Deduplicator(ChunkConfig(boilerplate_pages=3))
+    stripped = [deduper.strip_boilerplate(course_page(p)) for p in range(1, 7)]
+    for text in stripped[3:]:
+        assert "Spring Term" not in text
+        assert "of 6" not in text
+    assert "Page 1 of 6" in stripped[0]
+
+
+def test_strip_boilerplate_keeps_templated_body_lines():
+    deduper = Deduplicator(ChunkConfig(boilerplate_pages=3))
+    for p in range(1, 7):
+        text = deduper.strip_boilerplate(course_page(p))
+        assert f"Students will understand concept alpha{p}" in text
+        assert f"Quiz on alpha{p} worth 10%" in text
+        assert "Assessment:" in text
+        assert "Reading: Chapter 3" in text
+
+
+def test_strip_boilerplate_leaves_short_pages_alone():
+    deduper = Deduplicator(ChunkConfig(boilerplate_pages=1))
+    for p in range(1, 5):
+        text = f"Week {p}: Topic\nSummary of week {p}"
+        assert deduper.strip_boilerplate(text) == text
+
+
+def test_chunk_pages_keeps_weekly_content():
+    pages = [(p, course_page(p)) for p in range(1, 7)]
+    chunks = list(chunk_pages(pages))
+    by_page = {}
+    for chunk, meta in chunks:
+        by_page.setdefault(meta["page"], []).append(chunk)
+    assert sorted(by_page) == list(range(1, 7))
+    for p, page_chunks in by_page.items():
+        text = "\n".join(page_chunks)
+        assert f"Week {p}: Topic number {p}" in text
+        assert f"concept alpha{p}" in text
+        assert f"Quiz on alpha{p}" in text
+        assert "Reading: Chapter 3" in text
+        if p > 3:
+            assert "Spring Term" not in text
+
+
+def test_chunk_pages_drops_exact_duplicates():
+    text = "Week 1: Intro\nThe same paragraph about gradient descent and loss surfaces."
+    chunks = list(chunk_pages([(1, text), (2, text)]))
+    assert [meta["page"] for _, meta in chunks] == [1]
+
+
+def test_chunk_pages_respects_max_tokens():
+    config = ChunkConfig(max_tokens=20, overlap_tokens=5)
+    text = "Week 1: Long\n" + " ".join(f"word{i}" for i in range(100))
+    chunks = [chunk for chunk, _ in chunk_pages([(1, text)], config)]
+    assert len(chunks) > 1
+    assert all(len(chunk.split()) <= 20 for chunk in chunks)
@@ -0,0 +1,73 @@
+from curriculum_parser import (
+    RAG_SECTIONS,
+    Curriculum,
+    Week,
+    append_repairs,
+    parse_curriculum,
+    repair_prompt,
+    validate_curriculum,
+)
+
+
+def test_week_ranges_cover_every_week():
+    curriculum = parse_curriculum(
+        "Weekly Breakdown:\n"
+        "Weeks 1-2: Foundations\nCovers python and stats.\n"
+        "Week 3 to 4: Modelling\n"
+        "Learning Outcomes:\n- Build models\n"
+        "Assessment Strategy:\n- Project\n"
+    )
+    assert [(w.number, w.last) for w in curriculum.weeks] == [(1, 2), (3, 4)]
+    assert curriculum.week(2).title == "Foundations"
+    assert curriculum.weeks[0].notes == ["Covers python and stats."]
+    assert validate_curriculum(curriculum, 4, RAG_SECTIONS, week_fields=False) == []
+
+
+def test_week_bullet_does_not_open_a_section():
+    curriculum = parse_curriculum(
+        "Week 1: Intro\n- Topic: Basics\n- Assessment: Quiz 1\n- Reading: Chapter 1\n"
+        "Learning Outcomes:\n- Explain basics\n"
+    )
+    assert curriculum.assessment == []
+    assert curriculum.weeks[0].notes == ["Assessment: Quiz 1", "Reading: Chapter 1"]
+    issues = validate_curriculum(curriculum, 1, RAG_SECTIONS, week_fields=False)
+    assert ("missing_section", "assessment") in issues
+
+
+def test_heading_ends_the_open_week():
+    curriculum = parse_curriculum(
+        "Week 1: Intro\n- Topic: Basics\n### Assessment Strategy\n- Final exam\n"
+    )
+    assert curriculum.assessment == ["Final exam"]
+
+
+def test_unrecognised_lines_are_kept():
+    curriculum = parse_curriculum("Here is your plan.\nPrerequisites: algebra\nWeek 1: Intro\n")
+    assert curriculum.other == ["Here is your plan.", "Prerequisites: algebra"]
+
+
+def test_append_repairs_keeps_original_text():
+    text = "Weeks 1-2: Foundations\nCovers python and stats.\nUnparsed remark."
+    curriculum = parse_curriculum(text)
+    curriculum.weeks.append(Week(3, "Added"))
+    curriculum.assessment = ["Project"]
+    output = append_repairs(text, curriculum)
+    assert output.startswith(text)
+    assert "**Week 3: Added**" in output
+    assert "Weeks 1-2" not in output[len(text):]
+    assert "- Project" in output
+
+
+def test_repair_prompt_is_grounded_in_context():
+    prompt = repair_prompt(Curriculum(), [("missing_week", 2)], 2, context="Week 2 covers SQL.")
+    assert "Week 2 covers SQL." in prompt
+    assert "Do NOT add external information" in prompt
+
+
+def test_summary_falls_back_to_text_when_no_weeks_parse():
+    text = "Module 1 - Foundations\nCovers regression and loss functions.\n" * 200
+    curriculum = parse_curriculum(text)
+    summary = curriculum.summary(budget=50)
+    assert "Covers regression" in summary
+    assert summary.endswith("…")
+    assert "Covers regression" in repair_prompt(curriculum, [("missing_week", 1)], 1)
@@ -0,0 +1,53 @@
+import sqlite3
+
+import numpy as np
+import pytest
+
+import embeddings
+from embeddings import VectorCache
+
+
+def vectors(n, dim=8):
+    return np.random.default_rng(0).random((n, dim), dtype=np.float32)
+
+
+def test_vector_cache_evicts_least_recently_used(tmp_path):
+    cache = VectorCache(str(tmp_path / "v.sqlite"), max_entries=10, prune_every=1)
+    cache.put_many([(f"k{i}", v) for i, v in enumerate(vectors(10))])
+    cache.get_many(["k0"])
+    cache.put_many([("new", vectors(1)[0])])
+    keys = {f"k{i}" for i in range(10)} | {"new"}
+    kept = set(cache.get_many(sorted(keys)))
+    assert len(kept) == 9
+    assert {"k0", "new"} <= kept
+
+
+def test_vector_cache_drops_entries_past_max_age(tmp_path):
+    path = str(tmp_path / "v.sqlite")
+    cache = VectorCache(path, max_age_days=1)
+    cache.put_many([("old", vectors(1)[0]), ("fresh", vectors(1)[0])])
+    with sqlite3.connect(path) as conn:
+        conn.execute("UPDATE vectors SET used = 0 WHERE key = 'old'")
+    assert set(VectorCache(path, max_age_days=1).get_many(["old", "fresh"])) == {"fresh"}
+
+
+def test_float16_cache_is_enabled_from_environment(monkeypatch):
+    monkeypatch.setattr(embeddings, "VectorCache", lambda float16: float16)
+    monkeypatch.setattr(embeddings, "load_backend", lambda kind, batch_size: None)
+    monkeypatch.setattr(embeddings, "Embedder", lambda backend, cache: cache)
+    monkeypatch.setenv(embeddings.FLOAT16_ENV, "1")
+    assert embeddings.load_embedder() is True
+    monkeypatch.delenv(embeddings.FLOAT16_ENV)
+    assert embeddings.load_embedder() is False
+
+
+def test_auto_backend_falls_back_when_onnx_export_fails(monkeypatch):
+    def broken_onnx(batch_size):
+        raise OSError("export failed")
+
+    monkeypatch.setattr(embeddings, "OnnxBackend", broken_onnx)
+    monkeypatch.setattr(embeddings, "SentenceTransformerBackend", lambda batch_size: "torch")
+    with pytest.warns(RuntimeWarning):
+        assert embeddings.load_backend("auto") == "torch"
+    with pytest.raises(OSError):
+        embeddings.load_backend("onnx")
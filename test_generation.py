@@ -0,0 +1,56 @@
+from benchmark import FakeInferenceClient
+from curriculum_parser import parse_curriculum
+from generation import SectionedStream
+
+
+class FlakyClient(FakeInferenceClient):
+    """Streams break mid-answer, or drop a week, on the first try at a block."""
+
+    def __init__(self, fail_block=None, drop_week=None):
+        super().__init__(latency=0, tokens_per_second=0)
+        self.fail_block = fail_block
+        self.drop_week = drop_week
+        self.block_calls = {}
+
+    def chat_completion(self, model, messages, max_tokens=None, temperature=None, stream=False):
+        prompt = messages[-1]["content"]
+        stream_ = super().chat_completion(model, messages, max_tokens, temperature, stream)
+        for block, mode in ((self.fail_block, "fail"), (self.drop_week, "drop")):
+            if block is None or f"Expand ONLY Week {block[0]} to Week {block[1]}" not in prompt:
+                continue
+            with self._lock:
+                first = self.block_calls.setdefault(block, 0) == 0
+                self.block_calls[block] += 1
+            if first:
+                return self._broken(stream_) if mode == "fail" else self._without_week(prompt)
+        return stream_
+
+    def _broken(self, chunks):
+        for n, chunk in enumerate(chunks):
+            if n == 3:
+                raise ConnectionError("stream reset")
+            yield chunk
+
+    def _without_week(self, prompt):
+        text = self.respond(prompt)
+        start = text.index(f"**Week {self.drop_week[1]}:")
+        return self._stream([text[:start]])
+
+
+def sectioned(client, duration=8):
+    return SectionedStream(client, "Data Science", "Foundation Level", duration,
+                           "Theoretical Emphasis", "Continuous Assessment", block_size=4)
+
+
+def test_block_whose_stream_breaks_is_retried():
+    client = FlakyClient(fail_block=(5, 8))
+    curriculum = parse_curriculum("".join(sectioned(client)))
+    assert sorted(curriculum.week_numbers()) == list(range(1, 9))
+    assert client.block_calls[(5, 8)] == 2
+
+
+def test_block_missing_a_week_is_regenerated():
+    client = FlakyClient(drop_week=(1, 4))
+    curriculum = parse_curriculum("".join(sectioned(client)))
+    assert sorted(curriculum.week_numbers()) == list(range(1, 9))
+    assert client.block_calls[(1, 4)] == 2
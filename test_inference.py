@@ -0,0 +1,79 @@
+from types import SimpleNamespace
+
+import pytest
+
+from inference import Endpoint, InferenceGateway
+
+
+class HTTPError(Exception):
+
+    def __init__(self, status):
+        super().__init__(f"HTTP {status}")
+        self.response = SimpleNamespace(status_code=status)
+
+
+class FakeAsyncClient:
+    """AsyncInferenceClient stand-in: `failures[model]` errors are raised before answering."""
+
+    def __init__(self, failures=None):
+        self.failures = dict(failures or {})
+        self.calls = []
+
+    async def chat_completion(self, messages, model=None, max_tokens=None, temperature=None,
+                              stream=False):
+        self.calls.append(model)
+        pending = self.failures.get(model)
+        if pending:
+            error = pending.pop(0) if isinstance(pending, list) else pending
+            raise error
+        text = f"answer from {model}"
+        if not stream:
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+        return self._chunks(text.split(" "))
+
+    async def _chunks(self, tokens):
+        for token in tokens:
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=token))])
+
+
+def gateway(client, fallback=None, **options):
+    endpoint = Endpoint("fake")
+    endpoint._client = client
+    return InferenceGateway([endpoint], fallback or {}, base_delay=0, **options), endpoint
+
+
+def complete(gw, model):
+    response = gw.chat_completion(model, [{"role": "user", "content": "hi"}])
+    return response.choices[0].message.content
+
+
+def test_transient_errors_are_retried_on_the_same_model():
+    client = FakeAsyncClient({"a": [HTTPError(503), TimeoutError()]})
+    gw, endpoint = gateway(client, retries=2)
+    assert complete(gw, "a") == "answer from a"
+    assert client.calls == ["a", "a", "a"]
+    assert endpoint.healthy
+
+
+def test_failing_model_falls_back_and_marks_the_endpoint():
+    client = FakeAsyncClient({"a": HTTPError(503)})
+    gw, endpoint = gateway(client, {"a": ["b"]}, retries=1)
+    assert complete(gw, "a") == "answer from b"
+    assert client.calls == ["a", "a", "b"]
+    assert not endpoint.healthy
+
+
+def test_client_errors_are_not_retried():
+    client = FakeAsyncClient({"a": HTTPError(400), "b": HTTPError(400)})
+    gw, endpoint = gateway(client, {"a": ["b"]}, retries=3)
+    with pytest.raises(HTTPError):
+        complete(gw, "a")
+    assert client.calls == ["a", "b"]
+    assert endpoint.healthy
+
+
+def test_stream_falls_back_before_the_first_token():
+    client = FakeAsyncClient({"a": HTTPError(502)})
+    gw, _ = gateway(client, {"a": ["b"]}, retries=0)
+    chunks = gw.chat_completion("a", [{"role": "user", "content": "hi"}], stream=True)
+    assert [c.choices[0].delta.content for c in chunks] == ["answer", "from", "b"]
@@ -0,0 +1,71 @@
+import os
+
+import pytest
+
+from benchmark import HashingEmbedder, synthetic_curriculum, write_pdf
+from chunking import DEFAULT_CONFIG
+from doc_store import DocumentStore
+from knowledge_base import KnowledgeBase, knowledge_doc_id
+
+
+@pytest.fixture
+def embedder():
+    return HashingEmbedder()
+
+
+def make_kb(tmp_path, embedder, **kwargs):
+    store = DocumentStore(str(tmp_path / "lancedb"))
+    settings = {**DEFAULT_CONFIG.settings(), "model": embedder.name}
+    return KnowledgeBase(store, embedder.encode, settings, path=str(tmp_path / "kb.json"), **kwargs)
+
+
+def make_pdf(tmp_path, name, curriculum):
+    directory = tmp_path / name
+    os.makedirs(directory, exist_ok=True)
+    return write_pdf(curriculum, str(directory))
+
+
+def test_least_recently_used_sources_are_evicted_past_the_cap(tmp_path, embedder):
+    kb = make_kb(tmp_path, embedder)
+    paths = {name: make_pdf(tmp_path, name, synthetic_curriculum(name, 4, seed=n))
+             for n, name in enumerate(("a", "b", "c"))}
+    kb.add(paths["a"], "a.pdf")
+    kb.add(paths["b"], "b.pdf")
+    per_document = kb.documents()[0]["chunks"]
+    kb.max_chunks = 2 * per_document
+    kb.add(paths["a"], "a.pdf")  # unchanged re-upload still counts as use
+    kb.add(paths["c"], "c.pdf")
+    assert kb.sources() == ["a.pdf", "c.pdf"]
+    assert kb.store.has_document(knowledge_doc_id("a.pdf"))
+    assert not kb.store.has_document(knowledge_doc_id("b.pdf"))
+
+
+def test_new_version_reembeds_only_changed_pages(tmp_path, embedder):
+    kb = make_kb(tmp_path, embedder)
+    curriculum = synthetic_curriculum("Course", 12)
+    first = kb.add(make_pdf(tmp_path, "v1", curriculum), "course.pdf")
+    assert first["chunks_embedded"] == kb.documents()[0]["chunks"]
+
+    assert kb.add(make_pdf(tmp_path, "v1", curriculum), "course.pdf")["chunks_embedded"] == 0
+
+    curriculum.weeks[9].title = "Revised week ten"
+    second = kb.add(make_pdf(tmp_path, "v2", curriculum), "course.pdf")
+    assert 0 < len(second["changed_pages"]) < len(first["changed_pages"])
+    assert 0 < second["chunks_embedded"] < first["chunks_embedded"]
+    vector = embedder.encode("Revised week ten")
+    assert "Revised week ten" in kb.search("Revised week ten", vector, k=1)[0]["text"]
+
+
+def test_shrunk_document_and_removal_delete_rows(tmp_path, embedder):
+    kb = make_kb(tmp_path, embedder)
+    kb.add(make_pdf(tmp_path, "long", synthetic_curriculum("Course", 30)), "course.pdf")
+    pages = kb.documents()[0]["pages"]
+    result = kb.add(make_pdf(tmp_path, "short", synthetic_curriculum("Course", 6)), "course.pdf")
+    assert result["removed_pages"]
+    assert kb.documents()[0]["pages"] == pages - len(result["removed_pages"])
+    hits = kb.search("week", embedder.encode("week"), k=50)
+    assert {hit["page"] for hit in hits} <= set(range(1, kb.documents()[0]["pages"] + 1))
+
+    assert kb.remove("course.pdf")
+    assert kb.sources() == []
+    assert not kb.store.has_document(knowledge_doc_id("course.pdf"))
@@ -0,0 +1,20 @@
+from benchmark import HashingEmbedder
+from curriculum_parser import parse_curriculum
+from mentor import MentorIndex, MentorSession
+
+
+def test_unstructured_output_is_indexed_from_raw_text():
+    text = "Module 1 - Foundations\nCovers regression and loss functions.\n" * 80
+    index = MentorIndex(parse_curriculum(text), HashingEmbedder().encode, section_tokens=100)
+    assert len(index.sections) > 1
+    context, _ = MentorSession(index, token_budget=400).context("What does module 1 cover?")
+    assert "Covers regression" in context
+
+
+def test_week_questions_retrieve_that_week_first():
+    text = "Prerequisites: algebra\n"
+    text += "\n".join(f"Week {n}: Topic {n}\n- Topic: subject{n}" for n in range(1, 9))
+    index = MentorIndex(parse_curriculum(text), HashingEmbedder().encode)
+    assert any(section.startswith("Additional Notes") for _, section in index.sections)
+    sections = index.retrieve("Explain week 6", budget=15)
+    assert sections == ["**Week 6: Topic 6**\n- Topic: subject6"]
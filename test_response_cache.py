@@ -0,0 +1,87 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmark import FakeInferenceClient
+from generation import GenerationStats, TokenStream
+from response_cache import ResponseCache, cached_stream, exact_key
+
+
+class ScriptedStream:
+    """TokenStream stand-in whose tokens arrive only when `release` is set."""
+
+    def __init__(self, tokens, release=None):
+        self.model = "model"
+        self.prompt = "prompt"
+        self.max_tokens = 10
+        self.temperature = None
+        self.stats = GenerationStats("test", "model")
+        self.tokens = tokens
+        self.release = release
+        self.parts = []
+
+    @property
+    def text(self):
+        return "".join(self.parts)
+
+    def __iter__(self):
+        for token in self.tokens:
+            if self.release is not None:
+                self.release.wait()
+            self.parts.append(token)
+            yield token
+
+
+def test_identical_requests_share_one_upstream_call(tmp_path):
+    cache = ResponseCache(str(tmp_path / "r.sqlite"))
+    client = FakeInferenceClient(latency=0.2, tokens_per_second=0)
+
+    def generate():
+        stream = TokenStream(client, "test", "model", "Explain gradient descent", 50)
+        return "".join(cached_stream(cache, stream))
+
+    with ThreadPoolExecutor(4) as pool:
+        texts = list(pool.map(lambda _: generate(), range(4)))
+    assert client.calls == 1
+    assert len(set(texts)) == 1 and texts[0]
+    assert generate() == texts[0]
+    assert client.calls == 1
+
+
+def test_follower_takes_over_when_the_leader_is_closed(tmp_path):
+    cache = ResponseCache(str(tmp_path / "r.sqlite"))
+    release = threading.Event()
+    leader = cached_stream(cache, ScriptedStream(["a", "b"], release))
+    next_token = threading.Thread(target=lambda: next(leader, None))
+    next_token.start()
+    time.sleep(0.1)
+
+    follower = ThreadPoolExecutor(1).submit(
+        lambda: "".join(cached_stream(cache, ScriptedStream(["x", "y"])))
+    )
+    time.sleep(0.1)
+    release.set()
+    next_token.join()
+    leader.close()  # a Streamlit rerun abandons the leader mid-stream
+    assert follower.result(timeout=5) == "xy"
+
+
+def test_entries_expire_after_ttl(tmp_path):
+    cache = ResponseCache(str(tmp_path / "r.sqlite"), ttl=3600)
+    key = exact_key("model", "prompt")
+    cache.put(key, "text")
+    assert cache.get(key) == "text"
+    cache.ttl = -1
+    assert cache.get(key) is None
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ResponseCache(str(tmp_path / "r.sqlite"), max_entries=2)
+    cache.put("a", "A")
+    time.sleep(0.01)
+    cache.put("b", "B")
+    time.sleep(0.01)
+    assert cache.get("a") == "A"
+    time.sleep(0.01)
+    cache.put("c", "C")
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == ("A", None, "C")